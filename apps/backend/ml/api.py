@@ -1,13 +1,32 @@
-from fastapi import FastAPI, HTTPException, Request
+import time
+
+# Cold-start clocks. Standalone both are process start; under the pre-fork
+# launcher BOOT_STARTED is when the master began loading the app and model
+# and WORKER_STARTED is the fork
+BOOT_STARTED = WORKER_STARTED = time.time()
+
+from fastapi import FastAPI, HTTPException, Request, Header, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
-from predictionModel import MagajiCoMLPredictor
-import uvicorn
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from typing import List, Dict, Any, Optional, Union
+from predictionModel import FEATURE_NAMES, MagajiCoMLPredictor
+from profiling import ServerTimingMiddleware, profiler, stage, begin
+from live_predictions import LivePredictionHub
+from traffic_capture import TrafficCaptureMiddleware, hot_features, recorder as traffic_recorder
+from memory_budget import budget as memory_budget, deep_sizeof, evict_oldest, top_allocations
 import os
+import sys
 import asyncio
+import shutil
+import tempfile
 from collections import deque
-import time
+import hmac
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Request queue for load management
 request_queue = deque(maxlen=1000)
@@ -18,6 +37,29 @@ app = FastAPI(
     description="Advanced sports prediction using Machine Learning",
     version="3.0.0"
 )
+app.state.prediction_cache = {}
+app.state.rate_limits = {}
+
+PREDICTION_CACHE_TTL = 300
+RATE_LIMIT_WINDOW = 60
+# Bounds the added latency of explain=true on /predict/batch
+EXPLAIN_MAX_ROWS = int(os.getenv("ML_EXPLAIN_MAX_ROWS", 1000))
+
+# Warm-up runs before a worker serves; /ready reports 503 until it finishes
+WARMUP_ENABLED = os.getenv("ML_WARMUP", "true").lower() == "true"
+WARMUP_MAX_FIXTURES = int(os.getenv("ML_WARMUP_MAX_FIXTURES", 200))
+# Health checks don't count as the first request
+PROBE_PATHS = ("/ready", "/health", "/metrics")
+app.state.warmup = {
+    "ready": False,
+    "warmup_seconds": None,
+    "time_to_ready_seconds": None,
+    "worker_time_to_ready_seconds": None,
+    "hot_fixtures": 0,
+    "error": None,
+}
+app.state.first_request = None
+app.state.hot_fixtures = None
 
 # Rate limiting middleware
 @app.middleware("http")
@@ -25,22 +67,30 @@ async def rate_limit_middleware(request: Request, call_next):
     client_ip = request.client.host
     current_time = time.time()
     
-    # Simple in-memory rate limiting (100 requests per minute per IP)
-    if not hasattr(app.state, 'rate_limits'):
-        app.state.rate_limits = {}
-    
-    if client_ip in app.state.rate_limits:
-        requests, window_start = app.state.rate_limits[client_ip]
-        if current_time - window_start < 60:
-            if requests >= 100:
-                raise HTTPException(status_code=429, detail="Rate limit exceeded")
-            app.state.rate_limits[client_ip] = (requests + 1, window_start)
+    with stage("ratelimit"):
+        # Caches and rate limit windows shed entries past ML_MEMORY_BUDGET_MB
+        memory_budget.maybe_enforce()
+
+        # Simple in-memory rate limiting (100 requests per minute per IP)
+        if client_ip in app.state.rate_limits:
+            requests, window_start = app.state.rate_limits[client_ip]
+            if current_time - window_start < RATE_LIMIT_WINDOW:
+                if requests >= 100:
+                    # Exceptions raised in middleware bypass FastAPI's handlers
+                    return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded"})
+                app.state.rate_limits[client_ip] = (requests + 1, window_start)
+            else:
+                # Re-insert so dict order tracks window age for eviction
+                del app.state.rate_limits[client_ip]
+                app.state.rate_limits[client_ip] = (1, current_time)
         else:
             app.state.rate_limits[client_ip] = (1, current_time)
-    else:
-        app.state.rate_limits[client_ip] = (1, current_time)
     
+    # Routing, body parsing and pydantic validation until the handler runs
+    begin("validate")
     response = await call_next(request)
+    if app.state.first_request is None and request.url.path not in PROBE_PATHS:
+        app.state.first_request = {"path": request.url.path, "seconds": time.time() - current_time}
     return response
 
 # CORS configuration
@@ -50,12 +100,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Per-request stage timers and the Server-Timing header
+app.add_middleware(ServerTimingMiddleware)
+
+# Outermost: opt-in request sampling for replay load tests (ML_CAPTURE_RATE)
+app.add_middleware(TrafficCaptureMiddleware)
+
 # Initialize ML predictor
-model_path = os.path.join(os.path.dirname(__file__), "model_data.pkl")
+# MODEL_PATH may be absolute or relative to this directory; /train writes back to it
+model_path = os.path.join(os.path.dirname(__file__), os.getenv("MODEL_PATH", "model_data.mgjm"))
 predictor = MagajiCoMLPredictor(model_path=model_path)
 
+# Live in-play push; updates are shared between workers via an append-only log
+live_hub = LivePredictionHub(
+    lambda: predictor,
+    tick_seconds=float(os.getenv("ML_LIVE_TICK_SECONDS", 0.25)),
+    push_threshold=float(os.getenv("ML_LIVE_PUSH_THRESHOLD", 0.01)),
+    log_path=os.getenv("ML_LIVE_LOG_PATH", os.path.join(os.path.dirname(__file__), "data", "live_updates.jsonl"))
+)
+
+def _loaded_module_bytes(module_name: str, attr: str) -> int:
+    # Lazily imported components count once something has imported them
+    module = sys.modules.get(module_name)
+    return getattr(module, attr).memory_bytes() if module else 0
+
+# Lowest priority is evicted first; the rest is accounted but never evicted
+memory_budget.register(
+    "prediction_cache",
+    lambda: deep_sizeof(app.state.prediction_cache),
+    lambda nbytes: evict_oldest(
+        app.state.prediction_cache, nbytes,
+        expired=lambda entry: time.time() - entry[1] >= PREDICTION_CACHE_TTL,
+    ),
+    priority=0,
+)
+# Matches that never get a "finished" update would otherwise stay forever
+memory_budget.register("live_hub", live_hub.memory_bytes, live_hub.evict, priority=1)
+memory_budget.register(
+    "rate_limits",
+    lambda: deep_sizeof(app.state.rate_limits),
+    lambda nbytes: evict_oldest(
+        app.state.rate_limits, nbytes,
+        expired=lambda window: time.time() - window[1] >= RATE_LIMIT_WINDOW,
+    ),
+    priority=2,
+)
+memory_budget.register("model", lambda: predictor.memory_bytes())
+memory_budget.register("feature_store", lambda: _loaded_module_bytes("feature_store", "feature_store"))
+
 # Request models
 class PredictionRequest(BaseModel):
     features: List[float] = Field(..., min_length=7, max_length=7)
@@ -64,9 +159,67 @@ class PredictionRequest(BaseModel):
 class BatchPredictionRequest(BaseModel):
     predictions: List[PredictionRequest]
 
+# Bounds on rows per training chunk, shared by JSON and multipart /train
+TRAIN_CHUNK_MIN, TRAIN_CHUNK_MAX = 1_000, 1_000_000
+
 class TrainingRequest(BaseModel):
-    data: List[List[float]]
-    labels: List[int]
+    data: Optional[List[List[float]]] = None
+    labels: Optional[List[int]] = None
+    # Server-side dataset (CSV/Parquet/.npy) under ML_DATA_DIR, streamed in chunks
+    dataset_path: Optional[str] = None
+    label_column: str = "label"
+    chunk_size: int = Field(50_000, ge=TRAIN_CHUNK_MIN, le=TRAIN_CHUNK_MAX)
+
+    @model_validator(mode="after")
+    def check_source(self):
+        if self.dataset_path is None and (self.data is None or self.labels is None):
+            raise ValueError("Provide either data and labels, or dataset_path")
+        return self
+
+class EvaluationRequest(BaseModel):
+    # Labelled dataset (CSV/Parquet/.npy) under ML_DATA_DIR
+    dataset_path: str
+    label_column: str = "label"
+    chunk_size: int = Field(50_000, ge=1_000, le=5_000_000)
+    workers: Optional[int] = Field(None, ge=1, le=64)
+    record: bool = True
+
+class MatchResult(BaseModel):
+    home_team: str
+    away_team: str
+    home_goals: int = Field(..., ge=0)
+    away_goals: int = Field(..., ge=0)
+    match_id: Optional[Union[str, int]] = None
+
+class MatchResultsRequest(BaseModel):
+    # Finished results, oldest first
+    results: List[MatchResult]
+
+class Fixture(BaseModel):
+    home_team: str
+    away_team: str
+    # Not derivable from results; neutral unless the caller knows better
+    injuries: float = Field(0.5, ge=0, le=1)
+    match_context: Optional[Dict[str, str]] = None
+
+class FixturesRequest(BaseModel):
+    fixtures: List[Fixture]
+    predict: bool = False
+
+class LiveUpdate(BaseModel):
+    match_id: Union[str, int]
+    features: Optional[List[float]] = Field(None, min_length=7, max_length=7)
+    # Drops the match from the live set and tells subscribers
+    finished: bool = False
+
+    @model_validator(mode="after")
+    def check_features(self):
+        if self.features is None and not self.finished:
+            raise ValueError("features are required unless finished is true")
+        return self
+
+class LiveUpdatesRequest(BaseModel):
+    updates: List[LiveUpdate]
 
 # Response models
 class PredictionResponse(BaseModel):
@@ -78,6 +231,48 @@ class PredictionResponse(BaseModel):
     model_version: str
     features_used: List[float]
     match_context: Optional[Dict[str, str]] = None
+    # Per-feature contributions in percentage points (explain=true)
+    explanation: Optional[Dict[str, Any]] = None
+
+def prediction_cache_key(features: List[float], model_id: str) -> str:
+    """Cache key for a feature vector under the given serving model (predictor.model_id)"""
+    import hashlib
+    return hashlib.md5(f"{model_id}:{features}".encode()).hexdigest()
+
+def explanation_payloads(explained: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Per-row explanations from predictor.explain_batch, in percentage points"""
+    types = predictor.prediction_types
+    baseline = dict(zip(types, (explained["baseline"] * 100).tolist()))
+    return [
+        {
+            "method": explained["method"],
+            "baseline": baseline,
+            "contributions": {name: dict(zip(types, values)) for name, values in zip(FEATURE_NAMES, row)},
+        }
+        for row in (explained["contributions"] * 100).tolist()
+    ]
+
+def cached_explanations(features_list: List[List[float]]) -> List[Dict[str, Any]]:
+    """
+    Explanations for each feature vector. Reuses those cached with a
+    prediction, computes the rest in one vectorized call and stores them
+    alongside any cached prediction for the same features.
+    """
+    now = time.time()
+    model_id = predictor.model_id
+    keys = [prediction_cache_key(features, model_id) for features in features_list]
+    entries = [app.state.prediction_cache.get(key) for key in keys]
+    fresh = [entry if entry and now - entry[1] < PREDICTION_CACHE_TTL else None for entry in entries]
+    explanations = [entry[0].get("explanation") if entry else None for entry in fresh]
+
+    missing = [i for i, explanation in enumerate(explanations) if explanation is None]
+    if missing:
+        explained = predictor.explain_batch([features_list[i] for i in missing])
+        for i, explanation in zip(missing, explanation_payloads(explained)):
+            explanations[i] = explanation
+            if fresh[i] is not None:
+                fresh[i][0]["explanation"] = explanation
+    return explanations
 
 @app.get("/")
 async def root():
@@ -89,8 +284,17 @@ async def root():
             "predict": "/predict",
             "batch": "/predict/batch",
             "health": "/health",
+            "ready": "/ready",
             "model_info": "/model/info",
-            "train": "/train"
+            "train": "/train",
+            "evaluate": "/evaluate",
+            "features": "/features/fixtures",
+            "results": "/features/results",
+            "live_updates": "/live/updates",
+            "live_stream": "/live/stream",
+            "live_ws": "/live/ws",
+            "profile": "/admin/profile",
+            "memory": "/admin/memory"
         }
     }
 
@@ -121,18 +325,128 @@ async def health_check():
         "timestamp": time.time()
     }
 
+def load_hot_fixtures() -> List[List[float]]:
+    """
+    Feature vectors worth pre-computing at startup: fixtures listed in
+    ML_WARMUP_FIXTURES (JSON list of {home_team, away_team[, injuries]} or
+    {features}), then the most requested vectors in the traffic capture logs.
+    """
+    vectors = []
+    fixtures_path = os.getenv("ML_WARMUP_FIXTURES")
+    if fixtures_path and os.path.exists(fixtures_path):
+        with open(fixtures_path) as f:
+            entries = json.load(f)
+        vectors += [entry["features"] for entry in entries if "features" in entry]
+        teams = [entry for entry in entries if "features" not in entry]
+        if teams:
+            from feature_store import feature_store
+            vectors += feature_store.features_batch(teams).tolist()
+    vectors += hot_features(traffic_recorder.directory, limit=WARMUP_MAX_FIXTURES)
+
+    # Floats, as pydantic would parse them, so cache keys match real requests
+    unique = {}
+    for features in vectors:
+        if len(features) == predictor.features_required:
+            unique.setdefault(tuple(float(v) for v in features), None)
+    return [list(features) for features in unique][:WARMUP_MAX_FIXTURES]
+
+def prefill_prediction_cache(vectors: List[List[float]]) -> int:
+    """Cache /predict responses for the given vectors in one batch call"""
+    if not vectors:
+        return 0
+    now = time.time()
+    model_id = predictor.model_id
+    probabilities = predictor.predict_proba_batch(vectors)
+    for features, row, best in zip(vectors, probabilities, predictor.outcome_indices(probabilities)):
+        response = PredictionResponse(
+            prediction=predictor.prediction_types[best],
+            confidence=float(row[best]) * 100,
+            probabilities={k: float(v) * 100 for k, v in zip(predictor.prediction_types, row)},
+            model_version=predictor.model_version,
+            features_used=features,
+        )
+        app.state.prediction_cache[prediction_cache_key(features, model_id)] = (response.dict(), now)
+    return len(vectors)
+
+def warm_up():
+    """
+    Exercise the single-row, batch and explain inference paths and the
+    feature store, then pre-fill the prediction cache with hot fixtures,
+    so the first real requests don't pay for lazy initialization.
+    """
+    started = time.perf_counter()
+    neutral = [0.5] * predictor.features_required
+    grid = [[i / 63] * predictor.features_required for i in range(64)]
+
+    predictor.predict(neutral)
+    predictor.predict_proba_batch(grid)
+    # Also flattens a freshly trained sklearn forest for explanations
+    predictor.explain_batch(grid[:8])
+    explanation_payloads(predictor.explain_batch(grid[:1]))
+
+    # Catches up on the results log, which the first /features request would
+    # otherwise pay for; under the launcher the master already replayed it
+    from feature_store import feature_store
+    feature_store.sync()
+
+    if app.state.hot_fixtures is None:
+        app.state.hot_fixtures = load_hot_fixtures()
+    app.state.warmup["hot_fixtures"] = prefill_prediction_cache(app.state.hot_fixtures)
+    app.state.warmup["warmup_seconds"] = time.perf_counter() - started
+
+def mark_ready():
+    state = app.state.warmup
+    state["ready"] = True
+    now = time.time()
+    state["time_to_ready_seconds"] = now - BOOT_STARTED
+    state["worker_time_to_ready_seconds"] = now - WORKER_STARTED
+    # Tell the pre-fork launcher this worker can take over from the one it replaces
+    ready_fd = os.environ.pop("ML_READY_FD", None)
+    if ready_fd is not None:
+        try:
+            os.write(int(ready_fd), b"1")
+            os.close(int(ready_fd))
+        except OSError:
+            pass
+    logger.info(
+        f"✅ Ready in {state['time_to_ready_seconds']:.2f}s from boot, "
+        f"{state['worker_time_to_ready_seconds']:.2f}s in this process "
+        f"(warm-up {(state['warmup_seconds'] or 0) * 1000:.0f}ms, {state['hot_fixtures']} hot fixtures cached)"
+    )
+
 @app.on_event("startup")
 async def startup_event():
-    import time
     app.state.start_time = time.time()
     logger.info("🚀 ML Service started successfully")
+    if WARMUP_ENABLED:
+        # Blocks serving on purpose: this worker accepts nothing until warm
+        try:
+            warm_up()
+        except Exception as e:
+            app.state.warmup["error"] = str(e)
+            logger.exception("⚠️ Warm-up failed, serving cold")
+    mark_ready()
+    app.state.capture_flusher = asyncio.get_running_loop().create_task(traffic_recorder.flush_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Launcher workers leave via os._exit, which skips buffered file writes
+    traffic_recorder.close()
+
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: 503 until this worker has finished warming up"""
+    state = {**app.state.warmup, "first_request": app.state.first_request}
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content=state)
+    return state
 
 @app.get("/model/info")
 async def get_model_info():
     return predictor.get_model_info()
 
 @app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
+async def predict(request: PredictionRequest, explain: bool = False):
     """
     Make a prediction based on match features.
     
@@ -144,25 +458,40 @@ async def predict(request: PredictionRequest):
     - home_goals_against: Home team average goals conceded
     - away_goals_for: Away team average goals scored
     - away_goals_against: Away team average goals conceded
+
+    With explain=true the response includes each feature's contribution to
+    every class probability, relative to a baseline.
     """
     # Check cache first
-    import hashlib
-    cache_key = hashlib.md5(str(request.features).encode()).hexdigest()
-    
-    if not hasattr(app.state, 'prediction_cache'):
-        app.state.prediction_cache = {}
+    with stage("cache"):
+        model_id = predictor.model_id
+        cache_key = prediction_cache_key(request.features, model_id)
+        cached = app.state.prediction_cache.get(cache_key)
     
-    if cache_key in app.state.prediction_cache:
-        cached_result, timestamp = app.state.prediction_cache[cache_key]
-        if time.time() - timestamp < 300:  # 5 minute cache
+    if cached is not None:
+        cached_result, timestamp = cached
+        if time.time() - timestamp < PREDICTION_CACHE_TTL:
             cached_result['cached'] = True
-            return cached_result
+            if explain:
+                with stage("explain"):
+                    cached_explanations([request.features])
+                begin("serialize")
+                return cached_result
+            begin("serialize")
+            return {k: v for k, v in cached_result.items() if k != "explanation"}
     
     try:
         # Use semaphore to limit concurrent predictions
-        async with processing_semaphore:
-            result = predictor.predict(request.features)
+        with stage("queue"):
+            await processing_semaphore.acquire()
+        try:
+            with stage("model"):
+                result = predictor.predict(request.features)
+        finally:
+            processing_semaphore.release()
 
+        # Response building plus FastAPI's own serialization
+        begin("serialize")
         response = PredictionResponse(
             prediction=result["prediction"],
             confidence=result["confidence"] * 100,  # Convert to percentage
@@ -174,30 +503,48 @@ async def predict(request: PredictionRequest):
             match_context=request.match_context
         )
         
-        # Cache the result
-        app.state.prediction_cache[cache_key] = (response.dict(), time.time())
+        # Cache the result; re-inserting keeps dict order oldest-first for eviction.
+        # Skip it if a retrain swapped the model since the key was computed.
+        if predictor.model_id == model_id:
+            app.state.prediction_cache.pop(cache_key, None)
+            app.state.prediction_cache[cache_key] = (response.dict(), time.time())
+
+        if explain:
+            with stage("explain"):
+                response.explanation = cached_explanations([request.features])[0]
         
         return response
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/predict/batch")
-async def batch_predict(request: BatchPredictionRequest):
+async def batch_predict(request: BatchPredictionRequest, explain: bool = False):
     """
-    Make multiple predictions at once
+    Make multiple predictions at once; explain=true adds per-feature
+    contributions, computed for all rows in one vectorized pass
     """
+    if explain and len(request.predictions) > EXPLAIN_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"explain is limited to {EXPLAIN_MAX_ROWS} predictions per request")
     try:
         predictions = []
-        for pred_request in request.predictions:
-            result = predictor.predict(pred_request.features)
-            predictions.append({
-                "prediction": result["prediction"],
-                "confidence": result["confidence"] * 100,
-                "probabilities": {k: v * 100 for k, v in result["probabilities"].items()},
-                "features": pred_request.features,
-                "match_context": pred_request.match_context
-            })
+        with stage("model"):
+            for pred_request in request.predictions:
+                result = predictor.predict(pred_request.features)
+                predictions.append({
+                    "prediction": result["prediction"],
+                    "confidence": result["confidence"] * 100,
+                    "probabilities": {k: v * 100 for k, v in result["probabilities"].items()},
+                    "features": pred_request.features,
+                    "match_context": pred_request.match_context
+                })
+
+        if explain:
+            with stage("explain"):
+                explanations = cached_explanations([p.features for p in request.predictions])
+            for prediction, explanation in zip(predictions, explanations):
+                prediction["explanation"] = explanation
 
+        begin("serialize")
         return {
             "success": True,
             "count": len(predictions),
@@ -207,13 +554,111 @@ async def batch_predict(request: BatchPredictionRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def resolve_dataset_path(dataset_path: str) -> str:
+    """Only allow server-side datasets inside ML_DATA_DIR"""
+    data_dir = os.path.realpath(os.getenv("ML_DATA_DIR", os.path.join(os.path.dirname(__file__), "data")))
+    path = os.path.realpath(os.path.join(data_dir, dataset_path))
+    if os.path.commonpath([data_dir, path]) != data_dir:
+        raise HTTPException(status_code=400, detail="dataset_path must be inside ML_DATA_DIR")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Dataset not found: {dataset_path}")
+    return path
+
+async def train_from_upload(request: Request) -> Dict[str, Any]:
+    """Spool a multipart dataset upload to disk, then stream-train from it"""
+    from datasets import dataset_format
+
+    form = await request.form()
+    upload = form.get("file")
+    if upload is None or isinstance(upload, str):
+        raise HTTPException(status_code=400, detail="Multipart training requires a 'file' field")
+    try:
+        suffix = dataset_format(upload.filename or "")
+        chunk_size = int(form.get("chunk_size", 50_000))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not TRAIN_CHUNK_MIN <= chunk_size <= TRAIN_CHUNK_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"chunk_size must be between {TRAIN_CHUNK_MIN} and {TRAIN_CHUNK_MAX}",
+        )
+    label_column = form.get("label_column", "label")
+
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            await asyncio.to_thread(shutil.copyfileobj, upload.file, out, 1024 * 1024)
+        await upload.close()
+        return await asyncio.to_thread(
+            predictor.train_from_dataset, path, chunk_size=chunk_size, label_column=label_column
+        )
+    finally:
+        os.unlink(path)
+
 @app.post("/train")
-async def train_model(request: TrainingRequest):
+async def train_model(request: Request):
+    """
+    Train or retrain the ML model with new data.
+
+    Accepts either:
+    - JSON: {"data": [[...7 floats]], "labels": [...]} for small inline sets,
+      or {"dataset_path": "matches.parquet"} for a file under ML_DATA_DIR
+    - multipart/form-data with a CSV/Parquet/.npy "file" upload
+      (optional "label_column" and "chunk_size" fields)
+
+    Dataset training streams chunks, so memory is bounded by chunk_size,
+    and reports throughput in rows_per_sec.
+    """
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            result = await train_from_upload(request)
+        else:
+            try:
+                body = TrainingRequest.model_validate(await request.json())
+            except ValidationError as e:
+                raise RequestValidationError(e.errors())
+
+            if body.dataset_path is not None:
+                path = resolve_dataset_path(body.dataset_path)
+                result = await asyncio.to_thread(
+                    predictor.train_from_dataset,
+                    path,
+                    chunk_size=body.chunk_size,
+                    label_column=body.label_column
+                )
+            else:
+                result = predictor.train(body.data, body.labels)
+        return {
+            "success": True,
+            **result
+        }
+    except (HTTPException, RequestValidationError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/evaluate")
+async def evaluate_model(request: EvaluationRequest):
     """
-    Train or retrain the ML model with new data
+    Evaluate the current model on a large labelled dataset.
+
+    The dataset is streamed in chunks and scored in parallel processes;
+    returns accuracy, log-loss, Brier score, confusion matrix and
+    calibration bins, and records them in the model registry.
     """
+    from evaluation import evaluate_dataset, evaluate_and_record
+
+    path = resolve_dataset_path(request.dataset_path)
+    run = evaluate_and_record if request.record else evaluate_dataset
     try:
-        result = predictor.train(request.data, request.labels)
+        result = await asyncio.to_thread(
+            run,
+            predictor,
+            path,
+            chunk_size=request.chunk_size,
+            workers=request.workers,
+            label_column=request.label_column
+        )
         return {
             "success": True,
             **result
@@ -221,6 +666,159 @@ async def train_model(request: TrainingRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/model/registry")
+async def get_model_registry():
+    """
+    Registry metadata (including evaluations) for the model currently serving
+    """
+    from model_registry import registry
+    model_id = predictor.model_id
+    return registry.get(model_id) or {"model_id": model_id, "version": predictor.model_version}
+
+@app.post("/features/results")
+async def ingest_results(request: MatchResultsRequest):
+    """
+    Feed finished match results into the feature store (O(1) per result)
+    """
+    from feature_store import feature_store
+
+    try:
+        applied = feature_store.ingest([r.model_dump() for r in request.results])
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        "received": len(request.results),
+        "applied": applied,
+        **feature_store.stats()
+    }
+
+@app.post("/features/fixtures")
+async def fixture_features(request: FixturesRequest):
+    """
+    Build the 7-feature vectors for a list of fixtures (e.g. a whole matchday)
+    from the feature store, optionally with predictions
+    """
+    from feature_store import feature_store
+
+    features = feature_store.features_batch([f.model_dump() for f in request.fixtures])
+    probabilities = predictor.predict_proba_batch(features) if request.predict and len(features) else None
+    outcomes = predictor.outcome_indices(probabilities) if probabilities is not None else None
+
+    fixtures = []
+    for i, fixture in enumerate(request.fixtures):
+        entry = {
+            "home_team": fixture.home_team,
+            "away_team": fixture.away_team,
+            "features": features[i].tolist(),
+            "match_context": fixture.match_context
+        }
+        if probabilities is not None:
+            row, best = probabilities[i], outcomes[i]
+            entry.update(
+                prediction=predictor.prediction_types[best],
+                confidence=float(row[best]) * 100,
+                probabilities={k: float(v) * 100 for k, v in zip(predictor.prediction_types, row)}
+            )
+        fixtures.append(entry)
+
+    return {
+        "success": True,
+        "count": len(fixtures),
+        "fixtures": fixtures,
+        "model_version": predictor.model_version
+    }
+
+@app.get("/features/teams/{team}")
+async def team_features(team: str):
+    """
+    Rolling-window summary for one team
+    """
+    from feature_store import feature_store
+
+    summary = feature_store.team_summary(team)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No results for team: {team}")
+    return summary
+
+@app.post("/live/updates")
+async def live_updates(request: LiveUpdatesRequest):
+    """
+    Publish in-play feature updates; changed matches are recomputed on the
+    next tick and pushed to subscribers if their probabilities moved
+    """
+    try:
+        live_hub.publish([u.model_dump() for u in request.updates])
+    except OSError as e:
+        raise HTTPException(status_code=503, detail=f"Live update log unavailable: {e}")
+    return {"success": True, "accepted": len(request.updates)}
+
+@app.get("/live/stream")
+async def live_stream(request: Request, match_ids: str):
+    """
+    Server-Sent Events stream of prediction changes for comma-separated match_ids
+    """
+    ids = [m for m in match_ids.split(",") if m]
+    if not ids:
+        raise HTTPException(status_code=400, detail="match_ids is required")
+    subscription = live_hub.subscribe(ids)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"  # keep proxies from closing idle streams
+                    continue
+                name = "finished" if event.get("finished") else "prediction"
+                yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            live_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/live/ws")
+async def live_websocket(websocket: WebSocket):
+    """
+    WebSocket push. Client messages:
+    {"subscribe": [ids]}, {"unsubscribe": [ids]}
+    """
+    await websocket.accept()
+    subscription = live_hub.subscribe([])
+
+    async def receive():
+        while True:
+            message = await websocket.receive_json()
+            live_hub.add_matches(subscription, map(str, message.get("subscribe", [])))
+            live_hub.remove_matches(subscription, map(str, message.get("unsubscribe", [])))
+
+    async def send():
+        while True:
+            await websocket.send_json(await subscription.get())
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error and not isinstance(error, WebSocketDisconnect):
+                logger.error(f"Live WebSocket closed with error: {error}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        live_hub.unsubscribe(subscription)
+
+@app.get("/live/stats")
+async def live_stats():
+    return live_hub.get_stats()
+
 @app.get("/stats")
 async def get_statistics():
     """
@@ -238,16 +836,18 @@ async def get_statistics():
         "prediction_types": predictor.prediction_types,
         "status": "trained" if predictor.model else "fallback",
         "runtime_metrics": runtime_stats,
-        "cache_size": len(app.state.prediction_cache) if hasattr(app.state, 'prediction_cache') else 0
+        "cache_size": len(app.state.prediction_cache)
     }
 
-@app.get("/metrics")
+@app.get("/metrics", response_class=PlainTextResponse)
 async def get_metrics():
     """
     Prometheus-compatible metrics endpoint
     """
     from monitoring import monitor
     stats = monitor.get_stats()
+    warmup = app.state.warmup
+    first_request = app.state.first_request
     
     metrics = f"""# HELP ml_requests_total Total number of prediction requests
 # TYPE ml_requests_total counter
@@ -264,16 +864,147 @@ ml_latency_avg {stats['avg_latency_ms']}
 # HELP ml_uptime_seconds Service uptime in seconds
 # TYPE ml_uptime_seconds counter
 ml_uptime_seconds {stats['uptime_seconds']}
+
+# HELP ml_model_load_seconds Time to load and validate the model artifact
+# TYPE ml_model_load_seconds gauge
+ml_model_load_seconds {predictor.load_seconds}
+
+# HELP ml_time_to_first_prediction_seconds Model load plus first prediction latency
+# TYPE ml_time_to_first_prediction_seconds gauge
+ml_time_to_first_prediction_seconds {predictor.time_to_first_prediction or 0}
+
+# HELP ml_ready Whether this worker has finished warming up
+# TYPE ml_ready gauge
+ml_ready {int(warmup['ready'])}
+
+# HELP ml_time_to_ready_seconds Boot (incl. the launcher master's imports and model load) until warm and ready
+# TYPE ml_time_to_ready_seconds gauge
+ml_time_to_ready_seconds {warmup['time_to_ready_seconds'] or 0}
+
+# HELP ml_worker_time_to_ready_seconds This process (worker fork) start until warm and ready
+# TYPE ml_worker_time_to_ready_seconds gauge
+ml_worker_time_to_ready_seconds {warmup['worker_time_to_ready_seconds'] or 0}
+
+# HELP ml_warmup_seconds Warm-up inference and cache pre-fill duration
+# TYPE ml_warmup_seconds gauge
+ml_warmup_seconds {warmup['warmup_seconds'] or 0}
+
+# HELP ml_first_request_seconds Latency of the first request served after startup
+# TYPE ml_first_request_seconds gauge
+ml_first_request_seconds {first_request['seconds'] if first_request else 0}
+
+# HELP ml_memory_budget_bytes Memory budget for accounted components
+# TYPE ml_memory_budget_bytes gauge
+ml_memory_budget_bytes {memory_budget.budget_bytes}
+
+# HELP ml_memory_component_bytes Estimated bytes per component at the last budget check
+# TYPE ml_memory_component_bytes gauge
+"""
+    metrics += "".join(
+        f'ml_memory_component_bytes{{component="{name}"}} {consumer.bytes}\n'
+        for name, consumer in memory_budget.consumers.items()
+    )
+    metrics += f"""
+# HELP ml_memory_evicted_bytes_total Bytes evicted to stay within the memory budget
+# TYPE ml_memory_evicted_bytes_total counter
+ml_memory_evicted_bytes_total {memory_budget.stats['evicted_bytes']}
 """
     return metrics
 
+def require_admin(token: Optional[str]):
+    """Guard admin endpoints with the ML_ADMIN_TOKEN shared secret"""
+    expected = os.getenv("ML_ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ML_ADMIN_TOKEN not set)")
+    if not token or not hmac.compare_digest(token, expected):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/profile")
+async def profile(
+    requests: int = 0,
+    seconds: float = 10.0,
+    format: str = "collapsed",
+    interval_ms: float = 5.0,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Sample this worker with a statistical profiler until `requests` requests
+    have completed or `seconds` have elapsed, whichever comes first.
+
+    Returns collapsed stacks (flamegraph.pl / speedscope import) or a
+    speedscope JSON profile when format=speedscope.
+    """
+    require_admin(x_admin_token)
+    if format not in ("collapsed", "speedscope"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'speedscope'")
+
+    seconds = min(max(seconds, 0.1), 120.0)
+    interval = min(max(interval_ms, 1.0), 100.0) / 1000
+    try:
+        await profiler.run(requests=max(requests, 0), seconds=seconds, interval=interval)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "speedscope":
+        return profiler.speedscope()
+    return PlainTextResponse(profiler.collapsed())
+
+@app.post("/admin/capture")
+async def configure_capture(rate: float, x_admin_token: Optional[str] = Header(None)):
+    """
+    Set the traffic capture sample rate for this worker (0 disables)
+    """
+    require_admin(x_admin_token)
+    traffic_recorder.configure(rate)
+    return traffic_recorder.get_stats()
+
+@app.get("/admin/capture")
+async def capture_stats(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    return traffic_recorder.get_stats()
+
+@app.get("/admin/memory")
+async def memory_report(
+    tracemalloc_seconds: float = 0.0,
+    top: int = 25,
+    group_by: str = "lineno",
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Per-component memory accounting for this worker against the budget.
+
+    With tracemalloc_seconds > 0 (or PYTHONTRACEMALLOC set at startup) the
+    report also lists the top allocation sites; a temporary trace only sees
+    allocations made during the window.
+    """
+    import tracemalloc
+
+    require_admin(x_admin_token)
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by must be 'lineno', 'filename' or 'traceback'")
+
+    report = memory_budget.report()
+    if tracemalloc.is_tracing():
+        report["top_allocations"] = top_allocations(top, group_by)
+    elif tracemalloc_seconds > 0:
+        tracemalloc.start(25 if group_by == "traceback" else 1)
+        try:
+            await asyncio.sleep(min(tracemalloc_seconds, 60.0))
+            report["top_allocations"] = top_allocations(top, group_by)
+        finally:
+            tracemalloc.stop()
+    return report
+
 if __name__ == "__main__":
+    import uvicorn
+
     port = int(os.getenv("ML_PORT", 8000))
     print(f"🤖 Starting ML Service on http://0.0.0.0:{port}")
     uvicorn.run(
         "api:app",
         host="0.0.0.0",
         port=port,
-        reload=True,
+        # Development only; use launcher.py for production workers
+        reload=os.getenv("ML_RELOAD", "true").lower() == "true",
         log_level="info"
     )
\ No newline at end of file
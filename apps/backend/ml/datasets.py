@@ -0,0 +1,91 @@
+"""
+Chunked dataset readers for out-of-core training and evaluation.
+
+Every reader yields ``(X, y)`` NumPy chunks of at most ``chunk_size`` rows,
+so memory is bounded by the chunk size rather than the dataset size.
+
+Supported formats:
+- ``.csv``      pandas ``read_csv(chunksize=...)``
+- ``.parquet``  pyarrow ``ParquetFile.iter_batches``
+- ``.npy``      2-D array opened as a read-only memmap, label in the last column
+
+For CSV and Parquet the label lives in ``label_column`` and every other
+column is a feature, in file order.
+"""
+import os
+from typing import Iterator, Tuple
+
+import numpy as np
+
+SUPPORTED_EXTENSIONS = (".csv", ".parquet", ".npy")
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def dataset_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported dataset format '{ext}', expected one of {SUPPORTED_EXTENSIONS}")
+    return ext
+
+
+def iter_chunks(
+    path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    label_column: str = "label",
+    n_features: int = 7,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield ``(features, labels)`` chunks from a dataset on disk."""
+    ext = dataset_format(path)
+    if ext == ".csv":
+        chunks = _iter_csv(path, chunk_size, label_column)
+    elif ext == ".parquet":
+        chunks = _iter_parquet(path, chunk_size, label_column)
+    else:
+        chunks = _iter_npy(path, chunk_size)
+
+    for X, y in chunks:
+        if X.shape[1] != n_features:
+            raise ValueError(f"Dataset must have {n_features} feature columns, found {X.shape[1]}")
+        yield X, y
+
+
+def _split_frame(frame, label_column: str) -> Tuple[np.ndarray, np.ndarray]:
+    if label_column not in frame.columns:
+        raise ValueError(f"Label column '{label_column}' not found in dataset")
+    y = frame[label_column].to_numpy(dtype=np.int64)
+    X = frame.drop(columns=[label_column]).to_numpy(dtype=np.float64)
+    return X, y
+
+
+def _iter_csv(path: str, chunk_size: int, label_column: str):
+    import pandas as pd
+
+    for frame in pd.read_csv(path, chunksize=chunk_size):
+        yield _split_frame(frame, label_column)
+
+
+def _iter_parquet(path: str, chunk_size: int, label_column: str):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet datasets require pyarrow to be installed")
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield _split_frame(batch.to_pandas(), label_column)
+
+
+def _iter_npy(path: str, chunk_size: int):
+    data = np.load(path, mmap_mode="r")
+    if data.ndim != 2 or data.shape[1] < 2:
+        raise ValueError("NumPy datasets must be 2-D with the label in the last column")
+
+    for start in range(0, data.shape[0], chunk_size):
+        # Only the current slice of the memmap is paged in and copied
+        block = data[start:start + chunk_size]
+        yield np.asarray(block[:, :-1], dtype=np.float64), np.asarray(block[:, -1], dtype=np.int64)
+
+
+def holdout_mask(n_rows: int, chunk_index: int, test_size: float, seed: int = 42) -> np.ndarray:
+    """Deterministic per-chunk holdout mask, identical across passes."""
+    rng = np.random.default_rng((seed, chunk_index))
+    return rng.random(n_rows) < test_size
@@ -0,0 +1,239 @@
+"""
+Chunked, parallel offline evaluation of the MagajiCo predictor.
+
+A labelled dataset (CSV, Parquet or .npy, see ``datasets``) is streamed in
+chunks and scored across worker processes with vectorized inference. Each
+chunk returns a small ``PartialMetrics`` aggregate (counts and sums only),
+which are merged into accuracy, log-loss, Brier score, a confusion matrix
+and top-label calibration bins. Memory is independent of dataset size: at
+most ``2 * workers`` chunks are in flight, and each worker holds one chunk's
+features and probabilities (tree traversal works in fixed-size blocks).
+Workers default to the launcher's count, which follows the container's CPU
+quota and memory rather than the host's cores.
+
+For ``.npy`` datasets workers memmap the file and read their own row range,
+so no feature data crosses process boundaries.
+
+Usage:
+    python evaluation.py data/history.npy --workers 2 --chunk-size 50000
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from datasets import DEFAULT_CHUNK_SIZE, dataset_format, iter_chunks
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+N_CLASSES = 3
+CALIBRATION_BINS = 10
+_EPS = 1e-15
+
+# Predictor held by each worker process, set by _init_worker
+_worker_predictor = None
+
+
+class PartialMetrics:
+    """Additive evaluation aggregates for one or more chunks."""
+
+    def __init__(self, n_classes: int = N_CLASSES, n_bins: int = CALIBRATION_BINS):
+        self.rows = 0
+        self.correct = 0
+        self.log_loss_sum = 0.0
+        self.brier_sum = 0.0
+        self.confusion = np.zeros((n_classes, n_classes), dtype=np.int64)
+        self.bin_count = np.zeros(n_bins, dtype=np.int64)
+        self.bin_confidence = np.zeros(n_bins)
+        self.bin_correct = np.zeros(n_bins)
+
+    @classmethod
+    def from_chunk(cls, proba: np.ndarray, y: np.ndarray) -> "PartialMetrics":
+        metrics = cls(proba.shape[1])
+        n_classes, n_bins = proba.shape[1], len(metrics.bin_count)
+        rows = np.arange(len(y))
+        predicted = proba.argmax(axis=1)
+        confidence = proba[rows, predicted]
+        hit = predicted == y
+
+        metrics.rows = len(y)
+        metrics.correct = int(hit.sum())
+        metrics.log_loss_sum = float(-np.log(np.clip(proba[rows, y], _EPS, 1.0)).sum())
+        one_hot = np.zeros_like(proba)
+        one_hot[rows, y] = 1.0
+        metrics.brier_sum = float(((proba - one_hot) ** 2).sum())
+        metrics.confusion = np.bincount(
+            y * n_classes + predicted, minlength=n_classes * n_classes
+        ).reshape(n_classes, n_classes)
+
+        bins = np.minimum((confidence * n_bins).astype(np.int64), n_bins - 1)
+        metrics.bin_count = np.bincount(bins, minlength=n_bins)
+        metrics.bin_confidence = np.bincount(bins, weights=confidence, minlength=n_bins)
+        metrics.bin_correct = np.bincount(bins, weights=hit, minlength=n_bins)
+        return metrics
+
+    def merge(self, other: "PartialMetrics") -> "PartialMetrics":
+        self.rows += other.rows
+        self.correct += other.correct
+        self.log_loss_sum += other.log_loss_sum
+        self.brier_sum += other.brier_sum
+        self.confusion += other.confusion
+        self.bin_count += other.bin_count
+        self.bin_confidence += other.bin_confidence
+        self.bin_correct += other.bin_correct
+        return self
+
+    def summary(self) -> Dict[str, Any]:
+        if self.rows == 0:
+            raise ValueError("Dataset is empty")
+
+        n_bins = len(self.bin_count)
+        calibration = []
+        ece = 0.0
+        for i in range(n_bins):
+            count = int(self.bin_count[i])
+            entry = {"lower": i / n_bins, "upper": (i + 1) / n_bins, "count": count}
+            if count:
+                avg_confidence = self.bin_confidence[i] / count
+                accuracy = self.bin_correct[i] / count
+                entry.update(avg_confidence=float(avg_confidence), accuracy=float(accuracy))
+                ece += count / self.rows * abs(accuracy - avg_confidence)
+            calibration.append(entry)
+
+        return {
+            "rows": self.rows,
+            "accuracy": self.correct / self.rows,
+            "log_loss": self.log_loss_sum / self.rows,
+            "brier_score": self.brier_sum / self.rows,
+            "expected_calibration_error": float(ece),
+            "confusion_matrix": self.confusion.tolist(),
+            "calibration_bins": calibration,
+        }
+
+
+def _init_worker(predictor):
+    global _worker_predictor
+    _worker_predictor = predictor
+    if predictor.model is not None:
+        # One process per core already; avoid nested thread oversubscription
+        predictor.model.n_jobs = 1
+
+
+def _score_arrays(X: np.ndarray, y: np.ndarray) -> PartialMetrics:
+    if np.any((y < 0) | (y >= N_CLASSES)):
+        raise ValueError(f"Labels must be in 0..{N_CLASSES - 1}")
+    return PartialMetrics.from_chunk(_worker_predictor.predict_proba_batch(X), y)
+
+
+def _score_npy_range(path: str, start: int, stop: int) -> PartialMetrics:
+    block = np.load(path, mmap_mode="r")[start:stop]
+    return _score_arrays(np.asarray(block[:, :-1], dtype=np.float64), np.asarray(block[:, -1], dtype=np.int64))
+
+
+def evaluate_dataset(
+    predictor,
+    path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    label_column: str = "label",
+) -> Dict[str, Any]:
+    """Score a labelled dataset in parallel chunks and return merged metrics."""
+    if not workers:
+        from launcher import default_worker_count
+
+        workers = default_worker_count(float(os.getenv("ML_WORKER_MAX_MEMORY_MB", 256)))
+    # Before the pool forks, so it names the model the workers score with
+    model_id = predictor.model_id
+    started = time.perf_counter()
+    total = PartialMetrics()
+    ext = dataset_format(path)
+
+    # fork shares the loaded model with the workers instead of pickling it
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(predictor,)
+    ) as pool:
+        if ext == ".npy":
+            n_rows = np.load(path, mmap_mode="r").shape[0]
+            tasks = (
+                (_score_npy_range, path, start, min(start + chunk_size, n_rows))
+                for start in range(0, n_rows, chunk_size)
+            )
+        else:
+            tasks = (
+                (_score_arrays, X, y)
+                for X, y in iter_chunks(path, chunk_size, label_column, predictor.features_required)
+            )
+
+        # Keep a bounded number of chunks in flight so memory stays flat
+        pending = set()
+        for task in tasks:
+            pending.add(pool.submit(*task))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    total.merge(future.result())
+        for future in pending:
+            total.merge(future.result())
+
+    seconds = time.perf_counter() - started
+    result = total.summary()
+    result.update(
+        dataset=os.path.basename(path),
+        model_version=predictor.model_version,
+        model_id=model_id,
+        using_model=predictor.model is not None,
+        workers=workers,
+        chunk_size=chunk_size,
+        seconds=seconds,
+        rows_per_sec=total.rows / seconds if seconds > 0 else 0,
+    )
+    logger.info(
+        f"📊 Evaluated {total.rows} rows in {seconds:.1f}s "
+        f"({result['rows_per_sec']:.0f} rows/sec), accuracy: {result['accuracy']:.3f}, "
+        f"log-loss: {result['log_loss']:.3f}"
+    )
+    return result
+
+
+def evaluate_and_record(predictor, path: str, **kwargs) -> Dict[str, Any]:
+    """Evaluate and store the result in the model registry metadata."""
+    from model_registry import registry
+
+    result = evaluate_dataset(predictor, path, **kwargs)
+    registry.record_evaluation(result["model_id"], result)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the MagajiCo model on a labelled dataset")
+    parser.add_argument("dataset", help="CSV, Parquet or .npy dataset")
+    parser.add_argument("--model", default=os.path.join(os.path.dirname(__file__), "model_data.mgjm"))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--label-column", default="label")
+    parser.add_argument("--no-record", action="store_true", help="Don't write results to the registry")
+    args = parser.parse_args(argv)
+
+    from predictionModel import MagajiCoMLPredictor
+
+    predictor = MagajiCoMLPredictor(model_path=args.model)
+    run = evaluate_dataset if args.no_record else evaluate_and_record
+    result = run(
+        predictor, args.dataset,
+        chunk_size=args.chunk_size, workers=args.workers, label_column=args.label_column,
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Incremental feature store for the MagajiCo predictor.
+
+Ingests finished match results and keeps per-team rolling windows and
+head-to-head aggregates in fixed-size NumPy ring buffers with running sums,
+so each result is an O(1) update and any fixture's feature vector is a
+handful of array reads, with no rescans of history.
+
+The vector matches ``MagajiCoMLPredictor.predict``:
+    [home_strength, away_strength, home_advantage,
+     recent_form_home, recent_form_away, head_to_head, injuries]
+
+- strength:       0.6 * points-per-game (long window) / 3
+                  + 0.4 * goal share GF / (GF + GA)
+- home_advantage: home team's points-per-game in its home matches / 3
+- recent_form:    points-per-game over the short form window / 3
+- head_to_head:   home team's score in recent meetings (win 1, draw 0.5)
+- injuries:       not derivable from results; taken from the fixture,
+                  defaulting to the neutral 0.5
+
+Every value is in 0..1 and defaults to 0.5 without history.
+
+Results can be backed by an append-only JSONL log. Each process tails the
+log before serving, so pre-fork workers converge on the same state and a
+restart replays it.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NEUTRAL = 0.5
+
+
+def _grow(array: np.ndarray, rows: int) -> np.ndarray:
+    grown = np.zeros((rows,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _validate(result: Dict[str, Any]) -> Tuple[int, int]:
+    home_goals, away_goals = int(result["home_goals"]), int(result["away_goals"])
+    if home_goals < 0 or away_goals < 0:
+        raise ValueError("Goals must be non-negative")
+    if result["home_team"] == result["away_team"]:
+        raise ValueError("A team cannot play itself")
+    return home_goals, away_goals
+
+
+class FeatureStore:
+    def __init__(
+        self,
+        long_window: int = 20,
+        form_window: int = 5,
+        home_window: int = 10,
+        h2h_window: int = 10,
+        log_path: Optional[str] = None,
+        capacity: int = 256,
+    ):
+        if form_window > long_window:
+            raise ValueError("form_window must not exceed long_window")
+        self.long_window = long_window
+        self.form_window = form_window
+        self.home_window = home_window
+        self.h2h_window = h2h_window
+        self.log_path = log_path
+
+        self.team_index: Dict[str, int] = {}
+        self.pair_index: Dict[Tuple[int, int], int] = {}
+        self.seen_matches = set()
+        self.results_ingested = 0
+        self._log_offset = 0
+        self._lock = threading.Lock()
+
+        # Per-team rolling windows: ring buffers plus running sums
+        self.points = np.zeros((capacity, long_window), dtype=np.int8)
+        self.goals_for = np.zeros((capacity, long_window), dtype=np.int16)
+        self.goals_against = np.zeros((capacity, long_window), dtype=np.int16)
+        self.pos = np.zeros(capacity, dtype=np.int32)
+        self.count = np.zeros(capacity, dtype=np.int32)
+        self.points_sum = np.zeros(capacity, dtype=np.int32)
+        self.form_sum = np.zeros(capacity, dtype=np.int32)
+        self.goals_for_sum = np.zeros(capacity, dtype=np.int32)
+        self.goals_against_sum = np.zeros(capacity, dtype=np.int32)
+
+        self.home_points = np.zeros((capacity, home_window), dtype=np.int8)
+        self.home_pos = np.zeros(capacity, dtype=np.int32)
+        self.home_count = np.zeros(capacity, dtype=np.int32)
+        self.home_sum = np.zeros(capacity, dtype=np.int32)
+
+        # Head-to-head, scored from the lower team index's perspective
+        self.h2h_scores = np.zeros((capacity, h2h_window), dtype=np.float32)
+        self.h2h_pos = np.zeros(capacity, dtype=np.int32)
+        self.h2h_count = np.zeros(capacity, dtype=np.int32)
+        self.h2h_sum = np.zeros(capacity, dtype=np.float64)
+
+    # ------------------------------------------------------------------
+    # Index management
+    # ------------------------------------------------------------------
+    def _team(self, name: str) -> int:
+        index = self.team_index.get(name)
+        if index is None:
+            index = len(self.team_index)
+            if index == len(self.pos):
+                self._grow_teams(index * 2)
+            self.team_index[name] = index
+        return index
+
+    def _grow_teams(self, rows: int):
+        for attr in (
+            "points", "goals_for", "goals_against", "pos", "count", "points_sum",
+            "form_sum", "goals_for_sum", "goals_against_sum",
+            "home_points", "home_pos", "home_count", "home_sum",
+        ):
+            setattr(self, attr, _grow(getattr(self, attr), rows))
+
+    def _pair(self, a: int, b: int) -> int:
+        key = (a, b) if a < b else (b, a)
+        index = self.pair_index.get(key)
+        if index is None:
+            index = len(self.pair_index)
+            if index == len(self.h2h_pos):
+                for attr in ("h2h_scores", "h2h_pos", "h2h_count", "h2h_sum"):
+                    setattr(self, attr, _grow(getattr(self, attr), index * 2))
+            self.pair_index[key] = index
+        return index
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+    def _push_team(self, t: int, points: int, scored: int, conceded: int):
+        p = self.pos[t]
+        n = self.count[t]
+        # Read evicted values before overwriting the slot
+        if n >= self.form_window:
+            self.form_sum[t] -= self.points[t, (p - self.form_window) % self.long_window]
+        if n >= self.long_window:
+            self.points_sum[t] -= self.points[t, p]
+            self.goals_for_sum[t] -= self.goals_for[t, p]
+            self.goals_against_sum[t] -= self.goals_against[t, p]
+        else:
+            self.count[t] = n + 1
+
+        self.points[t, p] = points
+        self.goals_for[t, p] = scored
+        self.goals_against[t, p] = conceded
+        self.points_sum[t] += points
+        self.form_sum[t] += points
+        self.goals_for_sum[t] += scored
+        self.goals_against_sum[t] += conceded
+        self.pos[t] = (p + 1) % self.long_window
+
+    def _push_home(self, t: int, points: int):
+        p = self.home_pos[t]
+        if self.home_count[t] >= self.home_window:
+            self.home_sum[t] -= self.home_points[t, p]
+        else:
+            self.home_count[t] += 1
+        self.home_points[t, p] = points
+        self.home_sum[t] += points
+        self.home_pos[t] = (p + 1) % self.home_window
+
+    def _push_h2h(self, home: int, away: int, home_score: float):
+        pair = self._pair(home, away)
+        score = home_score if home < away else 1.0 - home_score
+        p = self.h2h_pos[pair]
+        if self.h2h_count[pair] >= self.h2h_window:
+            self.h2h_sum[pair] -= self.h2h_scores[pair, p]
+        else:
+            self.h2h_count[pair] += 1
+        self.h2h_scores[pair, p] = score
+        self.h2h_sum[pair] += score
+        self.h2h_pos[pair] = (p + 1) % self.h2h_window
+
+    def _apply(self, result: Dict[str, Any]) -> bool:
+        match_id = result.get("match_id")
+        if match_id is not None:
+            if match_id in self.seen_matches:
+                return False
+            self.seen_matches.add(match_id)
+
+        home_goals, away_goals = _validate(result)
+        home, away = self._team(result["home_team"]), self._team(result["away_team"])
+
+        if home_goals > away_goals:
+            home_points, away_points, home_score = 3, 0, 1.0
+        elif home_goals < away_goals:
+            home_points, away_points, home_score = 0, 3, 0.0
+        else:
+            home_points, away_points, home_score = 1, 1, 0.5
+
+        self._push_team(home, home_points, home_goals, away_goals)
+        self._push_team(away, away_points, away_goals, home_goals)
+        self._push_home(home, home_points)
+        self._push_h2h(home, away, home_score)
+        self.results_ingested += 1
+        return True
+
+    def ingest(self, results: Iterable[Dict[str, Any]]) -> int:
+        """
+        Add finished results, oldest first. With a log configured they are
+        appended to it and picked up by every process on its next sync.
+        Returns how many new results this process applied.
+        """
+        results = list(results)
+        if self.log_path is None:
+            with self._lock:
+                return sum(self._apply(result) for result in results)
+
+        for result in results:
+            # Validate before anything reaches the shared log
+            _validate(result)
+        lines = "".join(json.dumps(result, separators=(",", ":")) + "\n" for result in results)
+        self._append_log(lines)
+        return self.sync()
+
+    def _append_log(self, lines: str):
+        import fcntl
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+        with open(self.log_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(lines)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def sync(self) -> int:
+        """Apply results appended to the log since the last sync."""
+        if self.log_path is None:
+            return 0
+        with self._lock:
+            try:
+                if os.path.getsize(self.log_path) <= self._log_offset:
+                    return 0
+            except FileNotFoundError:
+                return 0
+
+            applied = 0
+            with open(self.log_path, "rb") as f:
+                f.seek(self._log_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # partial write, pick it up next time
+                    self._log_offset += len(line)
+                    try:
+                        applied += self._apply(json.loads(line))
+                    except (ValueError, KeyError) as e:
+                        # Skip bad lines rather than wedging every worker
+                        logger.error(f"⚠️ Skipping bad result in feature log: {e}")
+            return applied
+
+    # ------------------------------------------------------------------
+    # Features
+    # ------------------------------------------------------------------
+    def _indices(self, teams: List[str]) -> np.ndarray:
+        return np.array([self.team_index.get(team, -1) for team in teams], dtype=np.int64)
+
+    def _strength(self, idx: np.ndarray) -> np.ndarray:
+        known = idx >= 0
+        safe = np.where(known, idx, 0)
+        count = self.count[safe]
+        ppg = np.divide(self.points_sum[safe], count * 3.0, out=np.full(len(idx), NEUTRAL), where=count > 0)
+        goals = self.goals_for_sum[safe] + self.goals_against_sum[safe]
+        share = np.divide(self.goals_for_sum[safe], goals, out=np.full(len(idx), NEUTRAL), where=goals > 0)
+        return np.where(known, 0.6 * ppg + 0.4 * share, NEUTRAL)
+
+    def _form(self, idx: np.ndarray) -> np.ndarray:
+        known = idx >= 0
+        safe = np.where(known, idx, 0)
+        games = np.minimum(self.count[safe], self.form_window) * 3.0
+        form = np.divide(self.form_sum[safe], games, out=np.full(len(idx), NEUTRAL), where=games > 0)
+        return np.where(known, form, NEUTRAL)
+
+    def _home_advantage(self, idx: np.ndarray) -> np.ndarray:
+        known = idx >= 0
+        safe = np.where(known, idx, 0)
+        games = self.home_count[safe] * 3.0
+        rate = np.divide(self.home_sum[safe], games, out=np.full(len(idx), NEUTRAL), where=games > 0)
+        return np.where(known, rate, NEUTRAL)
+
+    def _head_to_head(self, home: np.ndarray, away: np.ndarray) -> np.ndarray:
+        out = np.full(len(home), NEUTRAL)
+        for i, (h, a) in enumerate(zip(home.tolist(), away.tolist())):
+            if h < 0 or a < 0:
+                continue
+            pair = self.pair_index.get((h, a) if h < a else (a, h))
+            if pair is None or self.h2h_count[pair] == 0:
+                continue
+            score = self.h2h_sum[pair] / self.h2h_count[pair]
+            out[i] = score if h < a else 1.0 - score
+        return out
+
+    def features_batch(self, fixtures: List[Dict[str, Any]]) -> np.ndarray:
+        """(n, 7) feature matrix for a list of {home_team, away_team[, injuries]}."""
+        self.sync()
+        with self._lock:
+            home = self._indices([f["home_team"] for f in fixtures])
+            away = self._indices([f["away_team"] for f in fixtures])
+            injuries = np.array([f.get("injuries", NEUTRAL) for f in fixtures], dtype=np.float64)
+            return np.column_stack([
+                self._strength(home),
+                self._strength(away),
+                self._home_advantage(home),
+                self._form(home),
+                self._form(away),
+                self._head_to_head(home, away),
+                injuries,
+            ])
+
+    def features(self, home_team: str, away_team: str, injuries: float = NEUTRAL) -> List[float]:
+        """Feature vector for one fixture, ready for MagajiCoMLPredictor.predict."""
+        fixture = {"home_team": home_team, "away_team": away_team, "injuries": injuries}
+        return self.features_batch([fixture])[0].tolist()
+
+    def team_summary(self, team: str) -> Optional[Dict[str, Any]]:
+        self.sync()
+        t = self.team_index.get(team)
+        if t is None:
+            return None
+        games = int(self.count[t])
+        return {
+            "team": team,
+            "games": games,
+            "points_per_game": float(self.points_sum[t] / games) if games else None,
+            "goals_for_per_game": float(self.goals_for_sum[t] / games) if games else None,
+            "goals_against_per_game": float(self.goals_against_sum[t] / games) if games else None,
+            "form": float(self._form(np.array([t]))[0]),
+            "strength": float(self._strength(np.array([t]))[0]),
+            "home_advantage": float(self._home_advantage(np.array([t]))[0]),
+        }
+
+    def memory_bytes(self) -> int:
+        """Estimated bytes held by the ring buffers and indexes"""
+        from memory_budget import deep_sizeof
+
+        arrays = sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
+        return arrays + deep_sizeof((self.team_index, self.pair_index, self.seen_matches))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "teams": len(self.team_index),
+            "pairs": len(self.pair_index),
+            "results_ingested": self.results_ingested,
+            "windows": {
+                "long": self.long_window,
+                "form": self.form_window,
+                "home": self.home_window,
+                "head_to_head": self.h2h_window,
+            },
+        }
+
+
+feature_store = FeatureStore(
+    log_path=os.getenv(
+        "ML_FEATURE_LOG_PATH",
+        os.path.join(os.path.dirname(__file__), "data", "match_results.jsonl"),
+    )
+)
@@ -0,0 +1,512 @@
+"""
+Pre-fork production launcher for the MagajiCo ML API.
+
+The master process imports the app once (FastAPI, NumPy, sklearn and the
+unpickled model), calls ``gc.freeze()`` so those objects are never touched
+by the collector again, then forks N uvicorn workers that share a single
+listening socket. Because the model lives in pages the workers only read,
+they stay shared copy-on-write instead of every worker unpickling its own.
+
+The master supervises the workers:
+- respawns workers that exit unexpectedly
+- recycles workers whose private memory (USS) grows past a threshold
+- performs a graceful rolling restart when the model file changes on disk
+  (e.g. after ``/train``) or on SIGHUP
+
+Each worker warms up before it serves (see ``api.warm_up``) and reports
+readiness to the master over a pipe; a replacement worker must be ready
+before the worker it replaces is drained.
+
+Usage:
+    python launcher.py --host 0.0.0.0 --port 8000 --workers 4
+
+Environment:
+    ML_WORKERS / WEB_CONCURRENCY   worker count (default: CPUs allowed by the cgroup
+                                   quota, capped by instance memory / max memory)
+    ML_WORKER_MAX_MEMORY_MB        per-worker USS recycle threshold (default 256)
+    ML_WORKER_GRACEFUL_TIMEOUT     seconds to drain a worker on restart (default 30)
+    ML_WORKER_READY_TIMEOUT        seconds to wait for a new worker to warm up (default 60)
+"""
+import time
+
+# Cold-start clock: workers of the first generation report time-to-ready
+# from here, so it covers the master's imports and model load
+LAUNCHER_STARTED = time.time()
+
+import argparse
+import gc
+import logging
+import math
+import os
+import select
+import signal
+import socket
+import sys
+from typing import Dict, Optional, Set
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Imported in the master so they live in the shared pages too. The master's
+# memory checks need psutil anyway.
+PRELOAD_MODULES = ["psutil"]
+
+# Pulled in lazily by a legacy pickled sklearn model or its first prediction;
+# only worth the import time when such a model is loaded (.mgjm needs none).
+SKLEARN_PRELOAD_MODULES = [
+    "sklearn.ensemble",
+    "sklearn.preprocessing",
+    "sklearn.tree",
+]
+
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# Share of the instance memory the workers may plan on; the rest is left to
+# the master, the shared model pages and the page cache.
+WORKER_MEMORY_SHARE = 0.8
+
+
+def _read_cgroup(*names: str) -> Optional[str]:
+    for name in names:
+        try:
+            with open(os.path.join(CGROUP_ROOT, name)) as f:
+                return f.read().strip()
+        except OSError:
+            continue
+    return None
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """CPUs allowed by the container's CFS quota (cgroup v2 or v1), if any."""
+    cpu_max = _read_cgroup("cpu.max")
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    quota = _read_cgroup("cpu/cpu.cfs_quota_us", "cpu,cpuacct/cpu.cfs_quota_us")
+    period = _read_cgroup("cpu/cpu.cfs_period_us", "cpu,cpuacct/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def instance_memory_bytes() -> Optional[int]:
+    """Container memory limit (cgroup v2 or v1), else physical memory."""
+    limit = _read_cgroup("memory.max", "memory/memory.limit_in_bytes")
+    # v1 reports "no limit" as a huge page-aligned number
+    if limit and limit != "max" and int(limit) < 1 << 60:
+        return int(limit)
+    try:
+        import psutil
+
+        return psutil.virtual_memory().total
+    except ImportError:
+        return None
+
+
+def default_worker_count(max_memory_mb: Optional[float] = None) -> int:
+    """
+    ML_WORKERS / WEB_CONCURRENCY if set. Otherwise one worker per CPU the
+    container may use (cgroup quota, else affinity), capped so that every
+    worker can reach ``max_memory_mb`` before recycling without the
+    instance running out of memory.
+    """
+    configured = os.getenv("ML_WORKERS") or os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    quota = cgroup_cpu_limit()
+    if quota:
+        cores = min(cores, math.ceil(quota))
+    workers = cores
+
+    memory = instance_memory_bytes()
+    if max_memory_mb and memory:
+        by_memory = int(memory * WORKER_MEMORY_SHARE // (max_memory_mb * 1024 * 1024))
+        if by_memory < workers:
+            logger.info(
+                f"📏 Capping workers at {max(1, by_memory)} (of {workers} CPUs): "
+                f"{memory / 1024 / 1024:.0f} MB instance, {max_memory_mb:.0f} MB per worker"
+            )
+        workers = min(workers, by_memory)
+    return max(1, workers)
+
+
+class PreforkLauncher:
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        workers: Optional[int] = None,
+        max_memory_mb: float = 256,
+        graceful_timeout: float = 30,
+        ready_timeout: float = 60,
+        check_interval: float = 2.0,
+        log_level: str = "info",
+    ):
+        self.host = host
+        self.port = port
+        self.num_workers = workers or default_worker_count(max_memory_mb)
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.graceful_timeout = graceful_timeout
+        self.ready_timeout = ready_timeout
+        self.check_interval = check_interval
+        self.log_level = log_level
+
+        self.app = None
+        self.sock: Optional[socket.socket] = None
+        self.workers: Dict[int, float] = {}  # pid -> start time
+        self.retiring: Set[int] = set()
+        self.ready_pipes: Dict[int, int] = {}  # pid -> read end, until ready
+
+        self.model_path: Optional[str] = None
+        # When the master started loading the app/model the workers serve
+        self.generation_started = LAUNCHER_STARTED
+        self.model_mtime: Optional[float] = None
+        self._pending_mtime: Optional[float] = None
+
+        self._stopping = False
+        self._restart_requested = False
+
+    # ------------------------------------------------------------------
+    # Master setup
+    # ------------------------------------------------------------------
+    def load_app(self):
+        """Import the app and heavy dependencies once, in the master."""
+        started = time.time()
+        import api
+
+        preload = PRELOAD_MODULES
+        if "sklearn" in sys.modules:
+            preload = preload + SKLEARN_PRELOAD_MODULES
+        for module in preload:
+            try:
+                __import__(module)
+            except ImportError:
+                logger.warning(f"⚠️ Could not preload {module}")
+
+        # Read capture logs once here instead of in every worker
+        try:
+            api.app.state.hot_fixtures = api.load_hot_fixtures()
+        except Exception:
+            logger.exception("⚠️ Could not load hot fixtures")
+        self._sync_feature_store()
+
+
+        self.app = api.app
+        # Training writes here, also when the configured model is a legacy pickle
+        self.model_path = api.predictor.artifact_path
+        self.model_mtime = self._read_model_mtime()
+        self._freeze()
+        logger.info(f"📦 App loaded in master in {time.time() - started:.2f}s")
+
+    def reload_model(self):
+        """Reload the predictor in the master so new workers inherit it."""
+        import api
+        from predictionModel import MagajiCoMLPredictor
+
+        self.generation_started = time.time()
+        gc.unfreeze()
+        api.predictor = MagajiCoMLPredictor(model_path=self.model_path)
+        self.model_mtime = self._read_model_mtime()
+        self._sync_feature_store()
+        self._freeze()
+        logger.info(f"🔁 Model reloaded in master ({api.predictor.model_version})")
+
+    def _sync_feature_store(self):
+        """Replay the results log here so workers only read what's appended after the fork."""
+        try:
+            from feature_store import feature_store
+            feature_store.sync()
+        except Exception:
+            logger.exception("⚠️ Could not replay the results log")
+
+    def _freeze(self):
+        # Collect first so garbage isn't frozen into the permanent generation
+        gc.collect()
+        gc.freeze()
+
+    def bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        self.sock = sock
+
+    def _install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_restart)
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _handle_restart(self, signum, frame):
+        self._restart_requested = True
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+    def spawn_worker(self, boot_started: Optional[float] = None) -> int:
+        """
+        Fork a worker. boot_started is where its time-to-ready starts: the
+        master's (re)load for a new generation, else the fork itself.
+        """
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            self._run_worker(ready_write, boot_started)
+        os.close(ready_write)
+        self.workers[pid] = time.time()
+        self.ready_pipes[pid] = ready_read
+        logger.info(f"👷 Worker {pid} started")
+        return pid
+
+    def wait_ready(self, pid: int, timeout: Optional[float] = None) -> bool:
+        """Block until the worker reports it is warm, it exits, or the timeout."""
+        fd = self.ready_pipes.pop(pid, None)
+        if fd is None:
+            return True
+        timeout = self.ready_timeout if timeout is None else timeout
+        started = time.time()
+        try:
+            readable, _, _ = select.select([fd], [], [], timeout)
+            # EOF without a byte means the worker died before it was ready
+            ready = bool(readable) and os.read(fd, 1) == b"1"
+        finally:
+            os.close(fd)
+        if ready:
+            logger.info(f"✅ Worker {pid} ready in {time.time() - started:.2f}s")
+        else:
+            logger.warning(f"⚠️ Worker {pid} not ready after {time.time() - started:.1f}s")
+        return ready
+
+    def _run_worker(self, ready_fd: int, boot_started: Optional[float] = None):
+        """Child process body; never returns."""
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        # Other workers' readiness pipes belong to the master
+        for fd in self.ready_pipes.values():
+            os.close(fd)
+
+        exit_code = 0
+        try:
+            import uvicorn
+            import api
+
+            api.WORKER_STARTED = time.time()
+            api.BOOT_STARTED = boot_started or api.WORKER_STARTED
+            os.environ["ML_READY_FD"] = str(ready_fd)
+
+            config = uvicorn.Config(
+                self.app,
+                log_level=self.log_level,
+                timeout_graceful_shutdown=int(self.graceful_timeout),
+            )
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except BaseException:
+            logger.exception("Worker crashed")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def stop_worker(self, pid: int, timeout: Optional[float] = None):
+        """Ask a worker to drain and exit, killing it after the timeout."""
+        timeout = self.graceful_timeout if timeout is None else timeout
+        self.retiring.add(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                break
+            time.sleep(0.1)
+        else:
+            logger.warning(f"⚠️ Worker {pid} did not exit in {timeout}s, killing")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+        self.workers.pop(pid, None)
+        self.retiring.discard(pid)
+        self._close_ready_pipe(pid)
+
+    def _close_ready_pipe(self, pid: int):
+        fd = self.ready_pipes.pop(pid, None)
+        if fd is not None:
+            os.close(fd)
+
+    def replace_worker(self, pid: int, reason: str, boot_started: Optional[float] = None) -> bool:
+        """
+        Start the replacement before draining the old worker. If the
+        replacement doesn't become ready, kill it and keep the old one.
+        """
+        logger.info(f"♻️ Replacing worker {pid}: {reason}")
+        replacement = self.spawn_worker(boot_started)
+        if not self.wait_ready(replacement):
+            logger.error(f"💥 Replacement {replacement} failed to start, keeping worker {pid}")
+            self.stop_worker(replacement, timeout=0)
+            return False
+        self.stop_worker(pid)
+        return True
+
+    def rolling_restart(self, reload_model: bool = False):
+        if reload_model:
+            self.reload_model()
+        for pid in list(self.workers):
+            if self._stopping:
+                break
+            if not self.replace_worker(
+                pid, "rolling restart", self.generation_started if reload_model else None
+            ):
+                logger.warning("⚠️ Rolling restart aborted, remaining workers keep running")
+                return
+        logger.info("✅ Rolling restart complete")
+
+    # ------------------------------------------------------------------
+    # Supervision
+    # ------------------------------------------------------------------
+    def _reap_workers(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            self._close_ready_pipe(pid)
+            if pid in self.retiring or started is None or self._stopping:
+                continue
+
+            logger.error(f"💥 Worker {pid} exited unexpectedly (status {status})")
+            if time.time() - started < 1:
+                # Avoid a tight crash loop if the app fails on boot
+                time.sleep(1)
+            self.spawn_worker()
+
+    def _check_memory(self):
+        import psutil
+
+        for pid in list(self.workers):
+            try:
+                process = psutil.Process(pid)
+                try:
+                    # USS counts only private pages, i.e. what COW has copied
+                    used = process.memory_full_info().uss
+                except psutil.AccessDenied:
+                    used = process.memory_info().rss
+            except psutil.NoSuchProcess:
+                continue
+            if used > self.max_memory_bytes:
+                self.replace_worker(pid, f"memory {used / 1024 / 1024:.0f}MB over threshold")
+
+    def _read_model_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.model_path).st_mtime
+        except (OSError, TypeError):
+            return None
+
+    def _model_changed(self) -> bool:
+        """True once the model file has a new mtime that held for one check."""
+        mtime = self._read_model_mtime()
+        if mtime is None or mtime == self.model_mtime:
+            self._pending_mtime = None
+            return False
+        if mtime != self._pending_mtime:
+            # Wait one more interval in case the file is still being written
+            self._pending_mtime = mtime
+            return False
+        self._pending_mtime = None
+        return True
+
+    def run(self):
+        self.load_app()
+        self.bind()
+        self._install_signal_handlers()
+        logger.info(
+            f"🤖 Starting ML Service on http://{self.host}:{self.port} "
+            f"with {self.num_workers} workers"
+        )
+
+        for pid in [self.spawn_worker(self.generation_started) for _ in range(self.num_workers)]:
+            self.wait_ready(pid)
+
+        while not self._stopping:
+            self._reap_workers()
+            if self._restart_requested:
+                self._restart_requested = False
+                self.rolling_restart(reload_model=True)
+            elif self._model_changed():
+                logger.info("📝 Model file changed, rolling restart")
+                self.rolling_restart(reload_model=True)
+            self._check_memory()
+            time.sleep(self.check_interval)
+
+        self.shutdown()
+
+    def shutdown(self):
+        logger.info("🛑 Shutting down workers")
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+        if self.sock:
+            self.sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MagajiCo ML API pre-fork launcher")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", os.getenv("ML_PORT", 8000))))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--max-memory-mb", type=float,
+        default=float(os.getenv("ML_WORKER_MAX_MEMORY_MB", 256)),
+    )
+    parser.add_argument(
+        "--graceful-timeout", type=float,
+        default=float(os.getenv("ML_WORKER_GRACEFUL_TIMEOUT", 30)),
+    )
+    parser.add_argument(
+        "--ready-timeout", type=float,
+        default=float(os.getenv("ML_WORKER_READY_TIMEOUT", 60)),
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    # Workers import the app from this directory
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    PreforkLauncher(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_memory_mb=args.max_memory_mb,
+        graceful_timeout=args.graceful_timeout,
+        ready_timeout=args.ready_timeout,
+        log_level=args.log_level,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
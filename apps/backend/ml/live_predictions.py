@@ -0,0 +1,311 @@
+"""
+Live in-play prediction push.
+
+Clients subscribe to match IDs over Server-Sent Events or a WebSocket;
+producers post feature updates per match. A tick loop coalesces the
+updates (last write per match wins), recomputes only the matches whose
+features changed in one vectorized ``predict_proba_batch`` call, and
+pushes a match to its subscribers only when a probability moved by at
+least the push threshold since the last push.
+
+With the pre-fork launcher an update and a subscriber can land on
+different workers, so updates go through a shared append-only JSONL log
+that every worker tails each tick (``tail -F`` style, surviving rotation).
+An empty ``ML_LIVE_LOG_PATH`` keeps the hub in-process only.
+
+Matches normally leave the hub when a producer posts ``finished``. State for
+matches that never get one is reclaimed under memory pressure: ``evict``
+drops the least recently updated matches, unsubscribed ones first.
+
+Environment:
+    ML_LIVE_LOG_PATH          shared update log (default data/live_updates.jsonl)
+    ML_LIVE_TICK_SECONDS      recompute interval (default 0.25)
+    ML_LIVE_PUSH_THRESHOLD    min probability change to push, 0-1 (default 0.01)
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SharedUpdateLog:
+    """Append-only JSONL log shared by workers, rotated past max_bytes."""
+
+    def __init__(self, path: str, max_bytes: int = 8 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = None
+        self._inode = None
+        self._partial = b""
+
+    def append(self, records: List[Dict[str, Any]]):
+        import fcntl
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        data = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+        # Lock a sidecar file: the log itself is replaced on rotation
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a") as f:
+                    f.write(data)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def read_new(self) -> List[Dict[str, Any]]:
+        """Records appended since the last call, following rotations."""
+        records = []
+        while True:
+            if self._file is None:
+                try:
+                    self._file = open(self.path, "rb")
+                except FileNotFoundError:
+                    return records
+                self._inode = os.fstat(self._file.fileno()).st_ino
+                self._partial = b""
+
+            records.extend(self._read_lines())
+            try:
+                current = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current == self._inode:
+                return records
+            # Rotated: old file is fully drained, switch to the new one
+            self._file.close()
+            self._file = None
+
+    def _read_lines(self) -> List[Dict[str, Any]]:
+        data = self._partial + self._file.read()
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        records = []
+        for line in lines:
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.error("⚠️ Skipping corrupt line in live update log")
+        return records
+
+
+class Subscription:
+    def __init__(self, match_ids: Iterable[str], max_queue: int = 256):
+        self.match_ids: Set[str] = set(match_ids)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+
+    def push(self, event: Dict[str, Any]):
+        if self.queue.full():
+            # Slow consumer: newer states supersede the oldest queued one
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Dict[str, Any]:
+        return await self.queue.get()
+
+
+class LivePredictionHub:
+    def __init__(
+        self,
+        get_predictor: Callable[[], Any],
+        tick_seconds: float = 0.25,
+        push_threshold: float = 0.01,
+        log_path: Optional[str] = None,
+    ):
+        self.get_predictor = get_predictor
+        self.tick_seconds = tick_seconds
+        self.push_threshold = push_threshold
+        self.log = SharedUpdateLog(log_path) if log_path else None
+
+        self.features: Dict[str, np.ndarray] = {}
+        self.latest: Dict[str, Dict[str, Any]] = {}
+        self.last_pushed: Dict[str, np.ndarray] = {}
+        self.dirty: Set[str] = set()
+        self.updated_at: Dict[str, float] = {}
+        self.subscribers: Dict[str, Set[Subscription]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {"updates": 0, "recomputed": 0, "pushed": 0, "suppressed": 0, "ticks": 0, "evicted": 0}
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+    def publish(self, updates: List[Dict[str, Any]]):
+        """
+        Accept {match_id, features} updates, applied on the next tick.
+        {match_id, finished: true} drops the match and notifies subscribers.
+        """
+        if self.log is not None:
+            self.log.append(updates)
+        else:
+            self._apply_updates(updates)
+        self.ensure_running()
+
+    def _apply_updates(self, updates: Iterable[Dict[str, Any]]):
+        now = time.time()
+        for update in updates:
+            match_id = str(update["match_id"])
+            if update.get("finished"):
+                self._finish(match_id)
+                continue
+            features = np.asarray(update["features"], dtype=np.float64)
+            previous = self.features.get(match_id)
+            self.stats["updates"] += 1
+            self.updated_at[match_id] = now
+            if previous is not None and np.array_equal(previous, features):
+                continue
+            self.features[match_id] = features
+            self.dirty.add(match_id)
+
+    def _drop(self, match_id: str):
+        for state in (self.features, self.latest, self.last_pushed, self.updated_at):
+            state.pop(match_id, None)
+        self.dirty.discard(match_id)
+
+    def _finish(self, match_id: str):
+        self._drop(match_id)
+        event = {"match_id": match_id, "finished": True, "timestamp": time.time()}
+        for subscription in self.subscribers.get(match_id, ()):
+            subscription.push(event)
+
+    # ------------------------------------------------------------------
+    # Subscribers
+    # ------------------------------------------------------------------
+    def subscribe(self, match_ids: Iterable[str]) -> Subscription:
+        subscription = Subscription([])
+        self.add_matches(subscription, match_ids)
+        self.ensure_running()
+        return subscription
+
+    def add_matches(self, subscription: Subscription, match_ids: Iterable[str]):
+        for match_id in map(str, match_ids):
+            subscription.match_ids.add(match_id)
+            self.subscribers.setdefault(match_id, set()).add(subscription)
+            # New subscribers get the current state straight away
+            if match_id in self.latest:
+                subscription.push(self.latest[match_id])
+
+    def remove_matches(self, subscription: Subscription, match_ids: Iterable[str]):
+        for match_id in map(str, match_ids):
+            subscription.match_ids.discard(match_id)
+            watchers = self.subscribers.get(match_id)
+            if watchers is not None:
+                watchers.discard(subscription)
+                if not watchers:
+                    del self.subscribers[match_id]
+
+    def unsubscribe(self, subscription: Subscription):
+        self.remove_matches(subscription, list(subscription.match_ids))
+
+    # ------------------------------------------------------------------
+    # Tick loop
+    # ------------------------------------------------------------------
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Live prediction tick failed")
+            await asyncio.sleep(self.tick_seconds)
+
+    def tick(self) -> int:
+        """Recompute changed matches and push moved ones; returns pushes."""
+        self.stats["ticks"] += 1
+        if self.log is not None:
+            self._apply_updates(self.log.read_new())
+        if not self.dirty:
+            return 0
+
+        match_ids = list(self.dirty)
+        predictor = self.get_predictor()
+        X = np.stack([self.features[m] for m in match_ids])
+        probabilities = predictor.predict_proba_batch(X)
+        # Only after a successful recompute, so a failed batch is retried next tick
+        self.dirty.difference_update(match_ids)
+        self.stats["recomputed"] += len(match_ids)
+
+        previous = np.stack([
+            self.last_pushed.get(m, np.full(probabilities.shape[1], np.nan)) for m in match_ids
+        ])
+        # NaN (never pushed) compares as moved
+        moved = ~(np.abs(probabilities - previous).max(axis=1) < self.push_threshold)
+
+        pushed = 0
+        now = time.time()
+        for i in np.flatnonzero(moved):
+            match_id = match_ids[i]
+            event = self._event(match_id, probabilities[i], predictor, now)
+            self.latest[match_id] = event
+            self.last_pushed[match_id] = probabilities[i]
+            for subscription in self.subscribers.get(match_id, ()):
+                subscription.push(event)
+                pushed += 1
+        self.stats["suppressed"] += len(match_ids) - int(moved.sum())
+        self.stats["pushed"] += pushed
+        return pushed
+
+    def _event(self, match_id: str, row: np.ndarray, predictor, now: float) -> Dict[str, Any]:
+        best = int(predictor.outcome_indices(row)[0])
+        return {
+            "match_id": match_id,
+            "prediction": predictor.prediction_types[best],
+            "confidence": float(row[best]) * 100,
+            "probabilities": {k: float(v) * 100 for k, v in zip(predictor.prediction_types, row)},
+            "features": self.features[match_id].tolist(),
+            "model_version": predictor.model_version,
+            "timestamp": now,
+        }
+
+    def memory_bytes(self) -> int:
+        """Estimated bytes held by per-match state (queues are bounded per subscriber)"""
+        from memory_budget import deep_sizeof
+
+        return deep_sizeof((self.features, self.latest, self.last_pushed, self.subscribers))
+
+    def evict(self, nbytes: int) -> int:
+        """
+        Drop per-match state until about nbytes are freed, least recently
+        updated first and matches nobody subscribes to before watched ones.
+        A dropped match comes back with its next update.
+        """
+        if not self.features:
+            return 0
+        from memory_budget import deep_sizeof
+
+        match_bytes = max(
+            deep_sizeof((self.features, self.latest, self.last_pushed)) // len(self.features), 1
+        )
+        stale = sorted(
+            self.features,
+            key=lambda m: (m in self.subscribers, self.updated_at.get(m, 0.0)),
+        )
+        freed = 0
+        for match_id in stale:
+            if freed >= nbytes:
+                break
+            self._drop(match_id)
+            freed += match_bytes
+            self.stats["evicted"] += 1
+        return freed
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "matches": len(self.features),
+            "subscribed_matches": len(self.subscribers),
+            "tick_seconds": self.tick_seconds,
+            "push_threshold": self.push_threshold,
+        }
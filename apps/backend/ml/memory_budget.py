@@ -0,0 +1,262 @@
+"""
+Process-wide memory budget for the ML API.
+
+Caches and state holders register a consumer: a function estimating its
+size in bytes and, if it can shed memory, an ``evict(nbytes)`` callback
+returning the estimated bytes freed. ``maybe_enforce`` (called per request,
+rate-limited to one check per ``ML_MEMORY_CHECK_SECONDS``) sums the
+estimates; past the budget, evictable consumers are asked to free memory,
+lowest priority (least valuable) first and largest first within a
+priority, until usage is back under the low watermark. Consumers without
+an evict callback (the model, feature store) are counted but never asked.
+
+Accounting is based on the estimates rather than RSS, because freed Python
+memory is not always returned to the OS and RSS-driven eviction would keep
+emptying caches. ``ML_MEMORY_RSS_LIMIT_MB`` optionally adds RSS as a second
+trigger, as a last line of defence against the instance's hard limit.
+
+Estimates sample large containers (``deep_sizeof``), so a check costs the
+same whatever the cache size. The mmap-loaded model artifact is counted at
+its full size, although its pages are shared between pre-fork workers.
+
+Environment:
+    ML_MEMORY_BUDGET_MB        budget for accounted memory (default 256)
+    ML_MEMORY_RSS_LIMIT_MB     also evict when process RSS passes this (default off)
+    ML_MEMORY_LOW_WATERMARK    evict down to this fraction of the budget (default 0.8)
+    ML_MEMORY_CHECK_SECONDS    minimum interval between checks (default 1)
+
+Set PYTHONTRACEMALLOC=<frames> to trace allocations from startup; otherwise
+``top_allocations`` is used over a short tracing window on demand.
+"""
+import itertools
+import logging
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+_CONTAINERS = (dict, list, tuple, set, frozenset)
+
+
+def deep_sizeof(obj: Any, sample: int = 64) -> int:
+    """
+    Estimated bytes held by obj and the containers/arrays it references.
+    Containers with more than ``sample`` items are extrapolated from their
+    first items. Other objects count their shallow size only.
+    """
+    seen = set()
+
+    def size(o) -> int:
+        if id(o) in seen:
+            return 0
+        seen.add(id(o))
+        if isinstance(o, np.ndarray):
+            return sys.getsizeof(o) + (0 if o.flags.owndata else o.nbytes)
+        total = sys.getsizeof(o)
+        if not isinstance(o, _CONTAINERS):
+            return total
+        items = o.items() if isinstance(o, dict) else o
+        head = list(itertools.islice(items, sample))
+        if isinstance(o, dict):
+            measured = sum(size(k) + size(v) for k, v in head)
+        else:
+            measured = sum(size(item) for item in head)
+        if len(o) > len(head):
+            measured = measured * len(o) // len(head)
+        return total + measured
+
+    return size(obj)
+
+
+def evict_oldest(mapping: dict, nbytes: int, expired: Optional[Callable[[Any], bool]] = None) -> int:
+    """
+    Drop entries from an insertion-ordered dict until about nbytes are freed:
+    expired entries first, then the oldest. Returns the estimated bytes freed.
+    """
+    if not mapping:
+        return 0
+    entry_bytes = max(deep_sizeof(mapping) // len(mapping), 1)
+    freed = 0
+    if expired is not None:
+        for key in [k for k, v in mapping.items() if expired(v)]:
+            del mapping[key]
+            freed += entry_bytes
+    while mapping and freed < nbytes:
+        del mapping[next(iter(mapping))]
+        freed += entry_bytes
+    return freed
+
+
+def process_rss() -> int:
+    import psutil
+
+    return psutil.Process().memory_info().rss
+
+
+class MemoryConsumer:
+    def __init__(
+        self,
+        name: str,
+        estimate: Callable[[], int],
+        evict: Optional[Callable[[int], int]] = None,
+        priority: int = 0,
+    ):
+        self.name = name
+        self.estimate = estimate
+        self.evict = evict
+        self.priority = priority
+        self.bytes = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "bytes": self.bytes,
+            "mb": self.bytes / MB,
+            "evictable": self.evict is not None,
+            "priority": self.priority,
+            "evictions": self.evictions,
+            "evicted_mb": self.evicted_bytes / MB,
+        }
+
+
+class MemoryBudget:
+    def __init__(
+        self,
+        budget_bytes: int,
+        rss_limit_bytes: Optional[int] = None,
+        low_watermark: float = 0.8,
+        check_seconds: float = 1.0,
+    ):
+        self.budget_bytes = budget_bytes
+        self.rss_limit_bytes = rss_limit_bytes
+        self.low_watermark = low_watermark
+        self.check_seconds = check_seconds
+        self.consumers: Dict[str, MemoryConsumer] = {}
+        self._next_check = 0.0
+        self.stats = {"checks": 0, "enforcements": 0, "evicted_bytes": 0, "last_enforced_at": None}
+
+    def register(
+        self,
+        name: str,
+        estimate: Callable[[], int],
+        evict: Optional[Callable[[int], int]] = None,
+        priority: int = 0,
+    ) -> MemoryConsumer:
+        """
+        Track a component. Lower priority is evicted first; non-evictable
+        consumers (evict=None) only count towards the budget.
+        """
+        consumer = MemoryConsumer(name, estimate, evict, priority)
+        self.consumers[name] = consumer
+        return consumer
+
+    def measure(self) -> int:
+        total = 0
+        for consumer in self.consumers.values():
+            try:
+                consumer.bytes = int(consumer.estimate())
+            except Exception:
+                logger.exception(f"Memory estimate failed for {consumer.name}")
+            total += consumer.bytes
+        return total
+
+    def maybe_enforce(self) -> int:
+        now = time.monotonic()
+        if now < self._next_check:
+            return 0
+        self._next_check = now + self.check_seconds
+        return self.enforce()
+
+    def enforce(self) -> int:
+        """Evict back under the low watermark if over budget; returns bytes freed."""
+        self.stats["checks"] += 1
+        total = self.measure()
+        over = total - self.budget_bytes
+        if self.rss_limit_bytes:
+            over = max(over, process_rss() - self.rss_limit_bytes)
+        if over <= 0:
+            return 0
+
+        need = over + int(self.budget_bytes * (1 - self.low_watermark))
+        candidates = sorted(
+            (c for c in self.consumers.values() if c.evict is not None and c.bytes > 0),
+            key=lambda c: (c.priority, -c.bytes),
+        )
+        freed = 0
+        for consumer in candidates:
+            if freed >= need:
+                break
+            try:
+                released = int(consumer.evict(min(need - freed, consumer.bytes)))
+            except Exception:
+                logger.exception(f"Memory eviction failed for {consumer.name}")
+                continue
+            consumer.evictions += 1
+            consumer.evicted_bytes += released
+            consumer.bytes = max(consumer.bytes - released, 0)
+            freed += released
+
+        self.stats["enforcements"] += 1
+        self.stats["evicted_bytes"] += freed
+        self.stats["last_enforced_at"] = time.time()
+        logger.warning(
+            f"🧹 Memory budget exceeded by {over / MB:.1f} MB; evicted {freed / MB:.1f} MB "
+            f"from {', '.join(c.name for c in candidates) or 'nothing evictable'}"
+        )
+        return freed
+
+    def report(self) -> Dict[str, Any]:
+        total = self.measure()
+        try:
+            rss = process_rss()
+        except Exception:
+            rss = None
+        return {
+            "budget_mb": self.budget_bytes / MB,
+            "rss_limit_mb": self.rss_limit_bytes / MB if self.rss_limit_bytes else None,
+            "low_watermark": self.low_watermark,
+            "accounted_mb": total / MB,
+            "utilization": total / self.budget_bytes if self.budget_bytes else None,
+            "rss_mb": rss / MB if rss is not None else None,
+            # Interpreter, libraries and anything no consumer accounts for
+            "unaccounted_mb": (rss - total) / MB if rss is not None else None,
+            "components": sorted(
+                (c.to_dict() for c in self.consumers.values()), key=lambda c: -c["bytes"]
+            ),
+            **self.stats,
+        }
+
+
+def top_allocations(limit: int = 25, group_by: str = "lineno") -> List[Dict[str, Any]]:
+    """Largest live allocation sites from the current tracemalloc traces."""
+    import tracemalloc
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+    return [
+        {
+            "location": str(stat.traceback[0]) if group_by != "traceback" else stat.traceback.format(),
+            "size_kb": stat.size / 1024,
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics(group_by)[:limit]
+    ]
+
+
+_rss_limit = float(os.getenv("ML_MEMORY_RSS_LIMIT_MB", 0))
+budget = MemoryBudget(
+    budget_bytes=int(float(os.getenv("ML_MEMORY_BUDGET_MB", 256)) * MB),
+    rss_limit_bytes=int(_rss_limit * MB) if _rss_limit > 0 else None,
+    low_watermark=float(os.getenv("ML_MEMORY_LOW_WATERMARK", 0.8)),
+    check_seconds=float(os.getenv("ML_MEMORY_CHECK_SECONDS", 1.0)),
+)
@@ -0,0 +1,415 @@
+"""
+MagajiCo model artifact format (``.mgjm``).
+
+Layout:
+    b"MGJMODEL"                 8-byte magic
+    uint32 little-endian        header length
+    header                      UTF-8 JSON (schema, versions, checksum, array index)
+    payload                     raw arrays, each starting on a 64-byte boundary
+
+The header can be read on its own (``read_header``) to inspect a model
+without loading it. The payload holds the fitted StandardScaler and the
+RandomForest flattened into node arrays. Loading memory-maps the file and
+wraps those arrays with ``np.frombuffer``, so nothing is unpickled, sklearn
+is not imported, and pre-fork workers share the same page-cache pages.
+
+Library versions are recorded for provenance. Only numpy's can affect
+loading: arrays are stored with explicit byte-order dtypes and evaluated by
+this module, so the sklearn version that trained the model doesn't matter
+once it is converted. ``library_mismatches`` reports a different numpy
+major version so it can be surfaced; legacy pickles, which do depend on
+the sklearn version, are checked by the predictor when unpickled.
+
+``ArtifactForest`` and ``ArtifactScaler`` implement the subset of the
+sklearn API the predictor uses (``predict_proba``, ``predict``,
+``transform``, ``classes_``), evaluating all trees and rows at once.
+
+Usage:
+    python model_artifact.py inspect model_data.mgjm
+    python model_artifact.py convert model_data.pkl model_data.mgjm
+    python model_artifact.py bench model_data.mgjm --rows 1 100 10000
+"""
+import hashlib
+import json
+import mmap
+import os
+import platform
+import struct
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"MGJMODEL"
+SCHEMA_VERSION = 1
+ALIGNMENT = 64
+ARTIFACT_EXTENSION = ".mgjm"
+_PREFIX = struct.Struct("<8sI")
+
+
+class ArtifactError(Exception):
+    """The artifact is missing, truncated, corrupt or incompatible."""
+
+
+class ArtifactScaler:
+    def __init__(self, mean: np.ndarray, scale: np.ndarray):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, X) -> np.ndarray:
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class ArtifactForest:
+    """Random forest evaluated from flat node arrays, vectorized over trees and rows."""
+
+    # Rows traversed together; keeps the (rows, trees) working set in cache
+    block_size = 4096
+
+    def __init__(self, arrays: Dict[str, np.ndarray], classes: np.ndarray, max_depth: int):
+        # children[2 * node + went_right], -1 below a leaf
+        self.children = arrays["children"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.classes_ = classes
+        self.n_estimators = len(self.roots)
+        self.max_depth = max_depth
+        self.n_jobs = 1
+        self._value_by_class = None
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node (global index) for every (row, tree)."""
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if len(X) <= self.block_size:
+            return self._apply_block(X)
+        return np.concatenate([
+            self._apply_block(X[start:start + self.block_size])
+            for start in range(0, len(X), self.block_size)
+        ])
+
+    def _start(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        flat = np.ascontiguousarray(X).ravel()
+        row_base = (np.arange(len(X)) * X.shape[1])[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_estimators)).copy()
+        return flat, row_base, nodes
+
+    def _step(self, flat: np.ndarray, row_base: np.ndarray, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """One level down every tree; returns (next nodes, split feature used)."""
+        split_feature = np.take(self.feature, nodes)
+        values = np.take(flat, row_base + split_feature)
+        went_right = ~(values <= np.take(self.threshold, nodes))
+        child = np.take(self.children, nodes * 2 + went_right)
+        # Rows already at a leaf see child == -1 and stay put
+        return np.where(child >= 0, child, nodes), split_feature
+
+    def _apply_block(self, X: np.ndarray) -> np.ndarray:
+        flat, row_base, nodes = self._start(X)
+        for _ in range(self.max_depth):
+            nodes, _ = self._step(flat, row_base, nodes)
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        # Averaged per block: the (rows, trees, classes) gather is ~2 KB per
+        # row for 100 trees, too much to build for a whole evaluation chunk
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty((len(X), self.value.shape[1]))
+        for start in range(0, len(X), self.block_size):
+            leaves = self._apply_block(X[start:start + self.block_size])
+            out[start:start + len(leaves)] = np.take(self.value, leaves, axis=0).mean(axis=1)
+        return out
+
+    def contributions(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decision-path attribution: (bias, contributions) where bias is the
+        forest-mean root value per class and contributions[row, feature] is
+        the mean change in class value over the splits on that feature along
+        each tree's path. bias + contributions.sum(axis=1) == predict_proba(X).
+        """
+        X = np.asarray(X, dtype=np.float32)
+        bias = np.take(self.value, self.roots, axis=0).mean(axis=0)
+        blocks = [
+            self._contributions_block(X[start:start + self.block_size])
+            for start in range(0, len(X), self.block_size)
+        ]
+        if not blocks:
+            return bias, np.zeros((0, X.shape[1], self.value.shape[1]))
+        return bias, np.concatenate(blocks)
+
+    def _contributions_block(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        if self._value_by_class is None:
+            # Class-major copy: contiguous 1-D gathers beat strided row gathers
+            self._value_by_class = np.ascontiguousarray(self.value.T)
+        by_class = self._value_by_class
+        flat, row_base, nodes = self._start(X)
+        totals = np.zeros((len(by_class), n_rows * n_features))
+        node_value = [np.take(values, nodes) for values in by_class]
+        for _ in range(self.max_depth):
+            nodes, split_feature = self._step(flat, row_base, nodes)
+            # Scatter-add over trees into (row, feature) slots, one class at a time
+            index = (row_base + split_feature).ravel()
+            for c, values in enumerate(by_class):
+                child_value = np.take(values, nodes)
+                # Zero at leaves (node unchanged), so no mask is needed
+                delta = child_value - node_value[c]
+                totals[c] += np.bincount(index, weights=delta.ravel(), minlength=n_rows * n_features)
+                node_value[c] = child_value
+        return totals.T.reshape(n_rows, n_features, len(by_class)) / self.n_estimators
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def library_versions() -> Dict[str, str]:
+    versions = {"python": platform.python_version(), "numpy": np.__version__}
+    sklearn = sys.modules.get("sklearn")
+    if sklearn is not None:
+        versions["sklearn"] = sklearn.__version__
+    return versions
+
+
+def library_mismatches(header: Dict[str, Any]) -> List[str]:
+    """Recorded library versions that differ from the runtime in a way that can matter."""
+    recorded = header.get("libraries", {}).get("numpy")
+    if recorded and recorded.split(".")[0] != np.__version__.split(".")[0]:
+        return [f"written with numpy {recorded}, running {np.__version__}"]
+    return []
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _flatten_forest(model) -> Tuple[Dict[str, np.ndarray], int]:
+    if not hasattr(model, "estimators_"):
+        raise ArtifactError(f"Unsupported model type: {type(model).__name__}")
+
+    left, right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        # Children become global node indices; leaves stay -1
+        left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        proba = tree.value[:, 0, :]
+        value.append(proba / np.maximum(proba.sum(axis=1, keepdims=True), 1e-300))
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        # Interleaved so one gather picks the next node
+        "children": np.stack([np.concatenate(left), np.concatenate(right)], axis=1).ravel().astype(np.int32),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "value": np.concatenate(value).astype(np.float64),
+        "roots": np.asarray(roots, dtype=np.int64),
+    }
+    return arrays, max_depth
+
+
+def forest_from_sklearn(model) -> ArtifactForest:
+    """In-memory ArtifactForest view of a fitted sklearn forest."""
+    arrays, max_depth = _flatten_forest(model)
+    return ArtifactForest(arrays, np.asarray(model.classes_), max_depth)
+
+
+def save_artifact(
+    path: str,
+    model,
+    scaler,
+    model_version: str,
+    accuracy: Optional[float] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Write model and scaler atomically; returns the header."""
+    arrays, max_depth = _flatten_forest(model)
+    arrays["scaler_mean"] = np.asarray(scaler.mean_, dtype=np.float64)
+    arrays["scaler_scale"] = np.asarray(scaler.scale_, dtype=np.float64)
+
+    index = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        index[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset += array.nbytes
+    payload_size = offset
+
+    payload = bytearray(payload_size)
+    for name, array in arrays.items():
+        start = index[name]["offset"]
+        payload[start:start + array.nbytes] = array.tobytes()
+
+    header = {
+        "schema": SCHEMA_VERSION,
+        "model_version": model_version,
+        "accuracy": accuracy,
+        "created_at": time.time(),
+        "libraries": library_versions(),
+        "model": {
+            "type": "random_forest",
+            "classes": [int(c) for c in model.classes_],
+            "n_features": int(arrays["scaler_mean"].shape[0]),
+            "n_estimators": len(arrays["roots"]),
+            "n_nodes": int(arrays["feature"].shape[0]),
+            "max_depth": int(max_depth),
+        },
+        "arrays": index,
+        "payload_size": payload_size,
+        "checksum": {"algorithm": "sha256", "value": hashlib.sha256(payload).hexdigest()},
+        "metadata": metadata or {},
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    payload_start = _align(_PREFIX.size + len(header_bytes))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREFIX.pack(MAGIC, len(header_bytes)))
+            f.write(header_bytes)
+            f.write(b"\0" * (payload_start - _PREFIX.size - len(header_bytes)))
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return header
+
+
+def _parse_prefix(prefix: bytes, path: str) -> int:
+    if len(prefix) < _PREFIX.size:
+        raise ArtifactError(f"{path} is truncated (no header)")
+    magic, header_length = _PREFIX.unpack(prefix[:_PREFIX.size])
+    if magic != MAGIC:
+        raise ArtifactError(f"{path} is not a MagajiCo model artifact")
+    return header_length
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """Read only the header, without touching the model payload."""
+    with open(path, "rb") as f:
+        header_length = _parse_prefix(f.read(_PREFIX.size), path)
+        raw = f.read(header_length)
+    if len(raw) < header_length:
+        raise ArtifactError(f"{path} is truncated (incomplete header)")
+    try:
+        header = json.loads(raw)
+    except ValueError:
+        raise ArtifactError(f"{path} has a corrupt header")
+    header["payload_offset"] = _align(_PREFIX.size + header_length)
+    return header
+
+
+def load_artifact(path: str, verify: str = "checksum") -> Tuple[ArtifactForest, ArtifactScaler, Dict[str, Any]]:
+    """
+    Memory-map and validate an artifact.
+    verify="checksum" hashes the payload; verify="size" only checks truncation.
+    Raises ArtifactError with a human-readable reason on any problem.
+    """
+    header = read_header(path)
+    if header.get("schema") != SCHEMA_VERSION:
+        raise ArtifactError(f"Unsupported artifact schema {header.get('schema')} (expected {SCHEMA_VERSION})")
+    if header.get("model", {}).get("type") != "random_forest":
+        raise ArtifactError(f"Unsupported model type {header.get('model', {}).get('type')}")
+
+    start = header["payload_offset"]
+    end = start + header["payload_size"]
+    file_size = os.path.getsize(path)
+    if file_size < end:
+        raise ArtifactError(f"{path} is truncated ({file_size} of {end} bytes)")
+
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if verify == "checksum":
+        digest = hashlib.sha256(memoryview(buffer)[start:end]).hexdigest()
+        if digest != header["checksum"]["value"]:
+            raise ArtifactError(f"{path} failed checksum verification")
+
+    arrays = {}
+    try:
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"]))
+            arrays[name] = np.frombuffer(
+                buffer, dtype=dtype, count=count, offset=start + spec["offset"]
+            ).reshape(spec["shape"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ArtifactError(f"{path} has an invalid array index: {e}")
+
+    model_info = header["model"]
+    forest = ArtifactForest(arrays, np.asarray(model_info["classes"]), model_info["max_depth"])
+    scaler = ArtifactScaler(arrays["scaler_mean"], arrays["scaler_scale"])
+    return forest, scaler, header
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or create MagajiCo model artifacts")
+    commands = parser.add_subparsers(dest="command", required=True)
+    inspect = commands.add_parser("inspect", help="Print an artifact header")
+    inspect.add_argument("path")
+    inspect.add_argument("--verify", action="store_true", help="Also validate the payload")
+    convert = commands.add_parser("convert", help="Convert a legacy model_data.pkl")
+    convert.add_argument("source")
+    convert.add_argument("target")
+    bench = commands.add_parser("bench", help="Time predict_proba against contributions")
+    bench.add_argument("path")
+    bench.add_argument("--rows", type=int, nargs="+", default=[1, 100, 1000, 10000])
+    bench.add_argument("--seconds", type=float, default=1.0, help="Timing budget per measurement")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        forest, scaler, header = load_artifact(args.path)
+        rng = np.random.default_rng(0)
+        print(f"{'rows':>8}{'predict ms':>14}{'explain ms':>14}{'overhead':>10}")
+        for n_rows in args.rows:
+            X = scaler.transform(rng.random((n_rows, header["model"]["n_features"])))
+            timings = []
+            for fn in (forest.predict_proba, forest.contributions):
+                fn(X)
+                runs, started = 0, time.perf_counter()
+                while time.perf_counter() - started < args.seconds:
+                    fn(X)
+                    runs += 1
+                timings.append((time.perf_counter() - started) / runs * 1000)
+            print(f"{n_rows:>8}{timings[0]:>14.2f}{timings[1]:>14.2f}{timings[1] / timings[0]:>9.1f}x")
+        return
+
+    if args.command == "inspect":
+        header = read_header(args.path)
+        if args.verify:
+            started = time.perf_counter()
+            load_artifact(args.path)
+            header["verified_in_seconds"] = time.perf_counter() - started
+        print(json.dumps(header, indent=2))
+    else:
+        import pickle
+
+        with open(args.source, "rb") as f:
+            saved = pickle.load(f)
+        header = save_artifact(
+            args.target,
+            saved["model"],
+            saved["scaler"],
+            model_version=saved.get("version", "MagajiCo-v2.1"),
+            accuracy=saved.get("accuracy"),
+        )
+        print(f"✅ Wrote {args.target} ({header['model']['n_estimators']} trees, {header['payload_size']} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Model registry: JSON metadata per trained model, stored next to the model.
+
+Entries are keyed by the predictor's ``model_id`` (version plus artifact
+checksum), so each retrained model gets its own entry, and hold whatever
+the training and evaluation jobs record about that model. Writes go through a temp file
+and ``os.replace`` so readers never see a half-written registry.
+"""
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_EVALUATIONS = 20
+
+
+class ModelRegistry:
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"⚠️ Could not read model registry {self.path}: {e}")
+            return {}
+
+    def get(self, model_id: str) -> Optional[Dict[str, Any]]:
+        return self.load().get(model_id)
+
+    def update(self, model_id: str, **metadata) -> Dict[str, Any]:
+        registry = self.load()
+        entry = registry.setdefault(model_id, {"model_id": model_id})
+        entry.update(metadata)
+        entry["updated_at"] = time.time()
+        self._write(registry)
+        return entry
+
+    def record_evaluation(self, model_id: str, evaluation: Dict[str, Any]) -> Dict[str, Any]:
+        """Store an evaluation as the latest result and append it to the history."""
+        registry = self.load()
+        entry = registry.setdefault(model_id, {"model_id": model_id})
+        if evaluation.get("model_version"):
+            entry["version"] = evaluation["model_version"]
+        evaluation = {**evaluation, "evaluated_at": time.time()}
+        entry["latest_evaluation"] = evaluation
+        entry["evaluations"] = (entry.get("evaluations", []) + [evaluation])[-MAX_EVALUATIONS:]
+        entry["updated_at"] = evaluation["evaluated_at"]
+        self._write(registry)
+        return entry
+
+    def _write(self, registry: Dict[str, Any]):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(registry, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+registry = ModelRegistry(
+    os.getenv("ML_REGISTRY_PATH", os.path.join(os.path.dirname(__file__), "model_registry.json"))
+)
@@ -0,0 +1,273 @@
+"""
+Request stage timing and on-demand sampling profiler for the ML API.
+
+``ServerTimingMiddleware`` starts a ``StageTimer`` per HTTP request and
+exposes it through a context variable, so any code on the request path can
+time a stage with ``stage("name")`` without the timer being passed around.
+The collected stages are emitted as a ``Server-Timing`` response header.
+
+``SamplingProfiler`` is a statistical profiler built on
+``sys._current_frames()``: a background thread samples every thread's stack
+at a fixed interval while a profiling session is active. Nothing runs when
+no session is active, and ``stage()`` is a shared no-op when there is no
+timer, so both cost nothing when disabled.
+
+Environment:
+    ML_SERVER_TIMING   emit Server-Timing headers (default "true")
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+_RUNNERS_PATH = os.path.join("asyncio", "runners.py")
+
+_current_timer: ContextVar[Optional["StageTimer"]] = ContextVar("stage_timer", default=None)
+_NULL_STAGE = nullcontext()
+
+
+class StageTimer:
+    """Ordered stage durations for a single request."""
+
+    __slots__ = ("started", "stages", "_open_name", "_open_start")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+        self._open_name: Optional[str] = None
+        self._open_start = 0.0
+
+    def begin(self, name: str):
+        """Open a stage that runs until the next stage starts or ``end()``."""
+        now = time.perf_counter()
+        self._close(now)
+        self._open_name = name
+        self._open_start = now
+
+    def end(self):
+        self._close(time.perf_counter())
+
+    def record(self, name: str, seconds: float):
+        self.stages.append((name, seconds))
+
+    def _close(self, now: float):
+        if self._open_name is not None:
+            self.stages.append((self._open_name, now - self._open_start))
+            self._open_name = None
+
+    def header(self) -> str:
+        self.end()
+        parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.3f}")
+        return ", ".join(parts)
+
+
+class _Stage:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer: StageTimer, name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.timer.end()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def current_timer() -> Optional[StageTimer]:
+    return _current_timer.get()
+
+
+def stage(name: str):
+    """Context manager timing ``name`` on the current request, if any."""
+    timer = _current_timer.get()
+    if timer is None:
+        return _NULL_STAGE
+    return _Stage(timer, name)
+
+
+def begin(name: str):
+    """Open a stage that ends when the next stage starts or the response does."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.begin(name)
+
+
+class SamplingProfiler:
+    """Samples thread stacks while a session is active."""
+
+    def __init__(self):
+        self.active = False
+        self.requests_seen = 0
+        self._lock = threading.Lock()
+        self._counts: Dict[Tuple, int] = defaultdict(int)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._interval = 0.005
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def start(self, interval: float = 0.005):
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profiling session is already running")
+        self._counts = defaultdict(int)
+        self._interval = interval
+        self.requests_seen = 0
+        self._stop.clear()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="ml-profiler", daemon=True)
+        self._thread.start()
+        self.active = True
+
+    def stop(self):
+        self.active = False
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self._elapsed = time.perf_counter() - self._started
+        self._lock.release()
+
+    async def run(self, requests: int = 0, seconds: float = 10.0, interval: float = 0.005):
+        """Profile until ``requests`` requests completed or ``seconds`` elapsed."""
+        self.start(interval)
+        try:
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                if requests and self.requests_seen >= requests:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            self.stop()
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self._interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                thread_name = names.get(thread_id, str(thread_id))
+                self._counts[(thread_name,) + tuple(stack)] += 1
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed-stack format, one ``a;b;c count`` per line."""
+        lines = []
+        for key, count in sorted(self._counts.items(), key=lambda item: -item[1]):
+            thread_name, stack = key[0], key[1:]
+            frames = [thread_name] + [f"{name} ({_short_path(path)}:{line})" for name, path, line in stack]
+            lines.append(f"{';'.join(frames)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> Dict[str, Any]:
+        """Speedscope sampled-profile JSON, one profile per thread."""
+        frames: List[Dict[str, Any]] = []
+        frame_index: Dict[Tuple, int] = {}
+        per_thread: Dict[str, Dict[str, list]] = defaultdict(lambda: {"samples": [], "weights": []})
+
+        for key, count in self._counts.items():
+            thread_name, stack = key[0], key[1:]
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    name, path, line = frame
+                    frames.append({"name": name, "file": path, "line": line})
+                indices.append(frame_index[frame])
+            per_thread[thread_name]["samples"].append(indices)
+            per_thread[thread_name]["weights"].append(count * self._interval)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": "MagajiCo ML API",
+            "exporter": "magajico-ml-profiler",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread_name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self._elapsed,
+                    "samples": data["samples"],
+                    "weights": data["weights"],
+                }
+                for thread_name, data in per_thread.items()
+            ],
+        }
+
+
+def _is_idle(frame) -> bool:
+    """
+    Skip threads parked in the event loop, a lock wait or an idle pool. The
+    pure-Python loop waits in selectors.py; uvloop waits in C, so an idle
+    uvloop thread's innermost Python frame is the asyncio runner calling it.
+    """
+    filename = frame.f_code.co_filename
+    name = frame.f_code.co_name
+    return (
+        filename.endswith("selectors.py")
+        or (filename.endswith(_RUNNERS_PATH) and name == "run")
+        or (filename.endswith("threading.py") and name == "wait")
+        or (filename.endswith("thread.py") and name == "_worker")
+    )
+
+
+def _short_path(path: str) -> str:
+    marker = "site-packages" + os.sep
+    if marker in path:
+        return path.split(marker, 1)[1]
+    return os.path.basename(path)
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware that times each request and sets Server-Timing."""
+
+    def __init__(self, app, enabled: Optional[bool] = None):
+        self.app = app
+        if enabled is None:
+            enabled = os.getenv("ML_SERVER_TIMING", "true").lower() == "true"
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (not self.enabled and not profiler.active):
+            await self.app(scope, receive, send)
+            return
+
+        timer = StageTimer()
+        token = _current_timer.set(timer)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and self.enabled:
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timer.header().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timer.reset(token)
+            if profiler.active:
+                profiler.requests_seen += 1
+
+
+profiler = SamplingProfiler()
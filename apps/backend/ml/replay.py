@@ -0,0 +1,447 @@
+"""
+Deterministic replay load tester for the ML API.
+
+Replays traffic captured by ``traffic_capture`` against the ASGI app
+in-process or a running server, and reports throughput, latency
+percentiles and error rates, overall and per endpoint.
+
+Schedules:
+    --speed N   replay the captured arrivals N times faster than production
+    --rate R    fixed open-loop rate of R requests/sec over the captured mix
+
+Captures are sampled (``ML_CAPTURE_RATE``, stored per entry as ``r``), so
+the captured timeline only holds a fraction of production traffic. With
+--speed the gaps between captured requests are scaled by their sample rate,
+so 1x sends requests at the production rate (over a proportionally shorter
+window); --sampled-timeline keeps the captured gaps instead. Gaps come from
+the ``t`` timestamps rather than ``dt``, which is per worker. The report
+shows the effective multiple of estimated production load.
+
+Replay is open-loop: requests are sent at their scheduled time whether or
+not earlier ones finished, and latency is measured from the scheduled time,
+so a saturated server shows up as latency instead of a slower send rate.
+Bodies that were too large to capture are synthesized from a seeded RNG,
+so the same capture and options always replay the same requests.
+
+Each captured client hash maps to a stable synthetic IP, so per-client rate
+limiting behaves as it did in production. The service's main client is the
+Node backend, so at high multiples that limiter dominates; --clients N
+spreads requests over N synthetic clients instead. Against a server the IP
+is sent as X-Forwarded-For, which uvicorn trusts from 127.0.0.1 by default.
+
+Replays don't modify real state. Endpoints that train or append to shared
+logs are skipped unless --allow-writes is given, and --app replays always
+run against scratch copies of the model, registry and logs.
+
+Usage:
+    python replay.py data/traffic --app api:app --speed 10
+    python replay.py data/traffic --url http://localhost:8000 --rate 200 --duration 60 --clients 50
+"""
+import argparse
+import asyncio
+import glob
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Rough bytes per row in captured JSON, used to size synthesized bodies
+BYTES_PER_TRAINING_ROW = 150
+BYTES_PER_BATCH_ITEM = 120
+
+# Endpoints that retrain the model or append to persistent/shared state
+WRITE_PATHS = ("/train", "/evaluate", "/features/results", "/live/updates")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_capture(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """Read capture files (or directories of them), merged in time order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "traffic-*.jsonl*")))
+        else:
+            files.extend(glob.glob(path))
+
+    records = []
+    for name in sorted(set(files)):
+        with open(name) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def is_write(record: Dict[str, Any]) -> bool:
+    return record["m"] != "GET" and record["p"] in WRITE_PATHS
+
+
+def production_rate(records: List[Dict[str, Any]]) -> Optional[float]:
+    """Estimated production requests/sec: each captured request stands for 1/r."""
+    span = records[-1]["t"] - records[0]["t"] if records else 0
+    if span <= 0:
+        return None
+    return sum(1 / record.get("r", 1.0) for record in records) / span
+
+
+def build_schedule(
+    records: List[Dict[str, Any]],
+    speed: Optional[float] = None,
+    rate: Optional[float] = None,
+    duration: Optional[float] = None,
+    limit: Optional[int] = None,
+    sampled_timeline: bool = False,
+) -> List[Tuple[float, int, Dict[str, Any]]]:
+    """(offset seconds, sequence number, record) in send order."""
+    if not records:
+        raise ValueError("No captured requests to replay")
+
+    schedule = []
+    if rate:
+        # Fixed rate: cycle through the captured mix until duration/limit
+        count = limit or (int(duration * rate) if duration else len(records))
+        for i in range(count):
+            schedule.append((i / rate, i, records[i % len(records)]))
+    else:
+        offset = 0.0
+        for i, record in enumerate(records):
+            if i:
+                gap = record["t"] - records[i - 1]["t"]
+                # A request sampled at rate r follows ~1/r production requests
+                # spread over the gap, so r * gap is the production spacing
+                if not sampled_timeline:
+                    gap *= record.get("r", 1.0)
+                offset += gap / (speed or 1.0)
+            if duration and offset > duration:
+                break
+            schedule.append((offset, i, record))
+        if limit:
+            schedule = schedule[:limit]
+    return schedule
+
+
+def request_body(record: Dict[str, Any], seq: int, seed: int = 42) -> bytes:
+    """Captured body, or a deterministic synthetic one of similar size."""
+    if "b" in record:
+        return json.dumps(record["b"]).encode()
+    size = record.get("n", 0)
+    if not size:
+        return b""
+
+    rng = np.random.default_rng((seed, seq))
+    if record["p"] == "/train":
+        rows = max(10, size // BYTES_PER_TRAINING_ROW)
+        body = {
+            "data": rng.random((rows, 7)).round(4).tolist(),
+            "labels": rng.integers(0, 3, rows).tolist(),
+        }
+    elif record["p"] == "/predict/batch":
+        items = max(1, size // BYTES_PER_BATCH_ITEM)
+        body = {"predictions": [{"features": row} for row in rng.random((items, 7)).round(4).tolist()]}
+    else:
+        body = {"features": rng.random(7).round(4).tolist()}
+    return json.dumps(body).encode()
+
+
+def synthetic_ip(client_hash: Optional[str], seq: int = 0, clients: Optional[int] = None) -> str:
+    """Stable IP for the captured client, or one of ``clients`` round-robin."""
+    if clients:
+        value = seq % clients + 1
+    elif client_hash:
+        value = int(client_hash, 16)
+    else:
+        return "127.0.0.1"
+    return f"10.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+
+def isolate_state() -> str:
+    """
+    Point the app's model, registry and logs at a scratch directory before it
+    is imported, so an in-process replay can't modify the real ones. The
+    model, registry and feature log are copied so reads behave as usual.
+    """
+    scratch = tempfile.mkdtemp(prefix="ml-replay-")
+    data_dir = os.path.join(HERE, "data")
+    model_path = os.path.join(HERE, os.getenv("MODEL_PATH", "model_data.mgjm"))
+    sources = {
+        "MODEL_PATH": model_path,
+        "ML_REGISTRY_PATH": os.getenv("ML_REGISTRY_PATH", os.path.join(HERE, "model_registry.json")),
+        "ML_FEATURE_LOG_PATH": os.getenv("ML_FEATURE_LOG_PATH", os.path.join(data_dir, "match_results.jsonl")),
+        "ML_LIVE_LOG_PATH": None,
+    }
+    for name, source in sources.items():
+        target = os.path.join(scratch, os.path.basename(source) if source else "live_updates.jsonl")
+        if source and os.path.exists(source):
+            shutil.copyfile(source, target)
+        os.environ[name] = target
+    # A legacy pickle is only used when the artifact is missing
+    legacy_model = os.path.splitext(model_path)[0] + ".pkl"
+    if not os.path.exists(model_path) and os.path.exists(legacy_model):
+        shutil.copyfile(legacy_model, os.path.join(scratch, os.path.basename(legacy_model)))
+    # Don't capture the replay itself
+    os.environ["ML_CAPTURE_RATE"] = "0"
+    return scratch
+
+
+class AsgiTarget:
+    """Drives an ASGI app directly, without sockets."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, query: str, body: bytes, client: str) -> int:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [
+                (b"host", b"replay"),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+            "client": (client, 0),
+            "server": ("replay", 80),
+        }
+        status = 0
+        sent = False
+        done = asyncio.Event()
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                done.set()
+
+        await self.app(scope, receive, send)
+        done.set()
+        return status
+
+    async def close(self):
+        pass
+
+
+class HttpTarget:
+    def __init__(self, base_url: str, max_connections: int):
+        import httpx
+
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=60,
+            limits=httpx.Limits(max_connections=max_connections),
+        )
+
+    async def request(self, method: str, path: str, query: str, body: bytes, client: str) -> int:
+        url = f"{path}?{query}" if query else path
+        response = await self.client.request(
+            method, url, content=body or None,
+            headers={"content-type": "application/json", "x-forwarded-for": client},
+        )
+        return response.status_code
+
+    async def close(self):
+        await self.client.aclose()
+
+
+async def replay(
+    schedule, target, max_in_flight: int = 1000, clients: Optional[int] = None
+) -> Tuple[List[Dict[str, Any]], float]:
+    loop = asyncio.get_running_loop()
+    limiter = asyncio.Semaphore(max_in_flight)
+    results: List[Dict[str, Any]] = []
+    start = loop.time()
+
+    async def fire(offset: float, seq: int, record: Dict[str, Any]):
+        scheduled = start + offset
+        try:
+            status = await target.request(
+                record["m"], record["p"], record.get("q", ""),
+                request_body(record, seq), synthetic_ip(record.get("c"), seq, clients),
+            )
+            error = None
+        except Exception as e:
+            status, error = 0, type(e).__name__
+        finally:
+            limiter.release()
+        results.append({
+            "path": record["p"],
+            "status": status,
+            "error": error,
+            "latency": loop.time() - scheduled,
+        })
+
+    tasks = []
+    for offset, seq, record in schedule:
+        delay = start + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await limiter.acquire()
+        tasks.append(asyncio.create_task(fire(offset, seq, record)))
+    await asyncio.gather(*tasks)
+    return results, loop.time() - start
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    values = np.asarray(latencies) * 1000
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"p50_ms": float(p50), "p90_ms": float(p90), "p99_ms": float(p99), "max_ms": float(values.max())}
+
+
+def summarize(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    def block(rows):
+        errors = sum(1 for r in rows if r["error"] or r["status"] >= 400)
+        statuses = defaultdict(int)
+        for r in rows:
+            statuses[r["error"] or str(r["status"])] += 1
+        return {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows) if rows else 0,
+            "statuses": dict(statuses),
+            **_latency_summary([r["latency"] for r in rows]),
+        }
+
+    by_path = defaultdict(list)
+    for r in results:
+        by_path[r["path"]].append(r)
+
+    return {
+        "wall_seconds": wall_seconds,
+        "throughput_rps": len(results) / wall_seconds if wall_seconds > 0 else 0,
+        **block(results),
+        "endpoints": {path: block(rows) for path, rows in sorted(by_path.items())},
+    }
+
+
+def print_report(summary: Dict[str, Any]):
+    schedule = summary["schedule"]
+    if schedule.get("load_multiplier"):
+        print(
+            f"Estimated production load {schedule['production_rps']:.2f} req/s; "
+            f"replay planned at {schedule['load_multiplier']:.2f}x"
+        )
+    if schedule.get("skipped_writes"):
+        print(f"Skipped {schedule['skipped_writes']} write requests (use --allow-writes to include them)")
+    print(
+        f"{summary['requests']} requests in {summary['wall_seconds']:.1f}s "
+        f"({summary['throughput_rps']:.1f} req/s), error rate {summary['error_rate']:.2%}"
+    )
+    header = f"{'endpoint':<24}{'reqs':>8}{'err%':>8}{'p50ms':>10}{'p90ms':>10}{'p99ms':>10}{'maxms':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(summary["endpoints"].items()) + [("ALL", summary)]
+    for path, s in rows:
+        print(
+            f"{path:<24}{s['requests']:>8}{s['error_rate'] * 100:>8.1f}"
+            f"{s['p50_ms']:>10.1f}{s['p90_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay captured ML API traffic")
+    parser.add_argument("capture", nargs="+", help="Capture files or directories")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--app", help="ASGI app to drive in-process, e.g. api:app")
+    target.add_argument("--url", help="Base URL of a running server")
+    schedule = parser.add_mutually_exclusive_group()
+    schedule.add_argument("--speed", type=float, default=1.0, help="Time compression, e.g. 1, 10, 100")
+    schedule.add_argument("--rate", type=float, help="Fixed open-loop requests/sec")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds of schedule")
+    parser.add_argument("--limit", type=int, help="Stop after this many requests")
+    parser.add_argument(
+        "--sampled-timeline", action="store_true",
+        help="Keep the captured gaps instead of scaling them to production rate",
+    )
+    parser.add_argument("--clients", type=int, help="Spread requests over N synthetic client IPs")
+    parser.add_argument(
+        "--allow-writes", action="store_true",
+        help="Also replay endpoints that train or append to logs (in-process replays use scratch copies)",
+    )
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    records = load_capture(args.capture)
+    production_rps = production_rate(records)
+    skipped = 0
+    if not args.allow_writes:
+        kept = [record for record in records if not is_write(record)]
+        skipped = len(records) - len(kept)
+        records = kept
+    if not records:
+        parser.error("No requests to replay (captures empty, or only writes without --allow-writes)")
+    plan = build_schedule(
+        records, speed=args.speed, rate=args.rate, duration=args.duration,
+        limit=args.limit, sampled_timeline=args.sampled_timeline,
+    )
+    planned_seconds = plan[-1][0] if plan else 0
+    planned_rps = len(plan) / planned_seconds if planned_seconds > 0 else None
+
+    scratch = None
+    if args.app:
+        scratch = isolate_state()
+        sys.path.insert(0, HERE)
+        module_name, _, attr = args.app.partition(":")
+        runner = AsgiTarget(getattr(importlib.import_module(module_name), attr or "app"))
+    else:
+        if args.allow_writes:
+            print(f"⚠️ Replaying write requests against {args.url} will modify its state", file=sys.stderr)
+        runner = HttpTarget(args.url, args.max_in_flight)
+
+    async def run():
+        try:
+            return await replay(plan, runner, args.max_in_flight, args.clients)
+        finally:
+            await runner.close()
+
+    started = time.time()
+    try:
+        results, wall = asyncio.run(run())
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+    summary = summarize(results, wall)
+    summary["started_at"] = started
+    summary["schedule"] = {
+        "speed": None if args.rate else args.speed,
+        "rate": args.rate,
+        "sampled_timeline": args.sampled_timeline,
+        "clients": args.clients,
+        "skipped_writes": skipped,
+        "production_rps": production_rps,
+        "planned_rps": planned_rps,
+        "load_multiplier": planned_rps / production_rps if planned_rps and production_rps else None,
+    }
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Tests that merged per-chunk evaluation aggregates match sklearn.metrics
+computed over the whole dataset at once.
+
+Run from this directory: python -m pytest test_evaluation.py
+"""
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, confusion_matrix, log_loss
+
+from evaluation import PartialMetrics
+
+
+@pytest.fixture
+def scored():
+    rng = np.random.default_rng(0)
+    proba = rng.dirichlet(np.ones(3), size=10_007)
+    y = rng.integers(0, 3, len(proba))
+    return proba, y
+
+
+def merged(proba, y, chunk_size):
+    total = PartialMetrics()
+    for start in range(0, len(y), chunk_size):
+        total.merge(PartialMetrics.from_chunk(proba[start:start + chunk_size], y[start:start + chunk_size]))
+    return total.summary()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 997, 10_007])
+def test_merged_chunks_match_sklearn(scored, chunk_size):
+    proba, y = scored
+    summary = merged(proba, y, chunk_size)
+
+    assert summary["rows"] == len(y)
+    assert summary["accuracy"] == pytest.approx(accuracy_score(y, proba.argmax(axis=1)))
+    assert summary["log_loss"] == pytest.approx(log_loss(y, proba, labels=[0, 1, 2]))
+    np.testing.assert_array_equal(
+        summary["confusion_matrix"], confusion_matrix(y, proba.argmax(axis=1), labels=[0, 1, 2])
+    )
+    # Multi-class Brier score: mean over rows of the squared error summed over classes
+    one_hot = np.eye(3)[y]
+    assert summary["brier_score"] == pytest.approx(np.mean(((proba - one_hot) ** 2).sum(axis=1)))
+
+
+def test_calibration_bins_cover_every_row(scored):
+    proba, y = scored
+    summary = merged(proba, y, 997)
+
+    bins = summary["calibration_bins"]
+    assert sum(b["count"] for b in bins) == len(y)
+    for b in bins:
+        if b["count"]:
+            assert b["lower"] <= b["avg_confidence"] <= b["upper"]
+
+
+def test_empty_dataset_is_rejected():
+    with pytest.raises(ValueError):
+        PartialMetrics().summary()
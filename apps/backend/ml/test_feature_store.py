@@ -0,0 +1,124 @@
+"""
+Tests pinning the feature store's ring buffers and running sums to a
+brute-force recomputation over the full result history.
+
+Run from this directory: python -m pytest test_feature_store.py
+"""
+import numpy as np
+import pytest
+
+from feature_store import FeatureStore
+
+WINDOWS = {"long_window": 6, "form_window": 3, "home_window": 4, "h2h_window": 3}
+
+
+def random_results(n, teams=12, seed=0):
+    rng = np.random.default_rng(seed)
+    results = []
+    for i in range(n):
+        home, away = rng.choice(teams, 2, replace=False)
+        results.append({
+            "match_id": f"m{i}",
+            "home_team": f"team{home}",
+            "away_team": f"team{away}",
+            "home_goals": int(rng.integers(0, 5)),
+            "away_goals": int(rng.integers(0, 5)),
+        })
+    return results
+
+
+def brute_force_features(results, home_team, away_team, injuries=0.5):
+    """The documented feature definitions, recomputed from scratch."""
+    games = {}     # team -> [(points, scored, conceded)]
+    home_games = {}  # team -> [points]
+    meetings = []  # (home, away, home_score)
+    for r in results:
+        hg, ag = r["home_goals"], r["away_goals"]
+        hp, ap = (3, 0) if hg > ag else (0, 3) if hg < ag else (1, 1)
+        games.setdefault(r["home_team"], []).append((hp, hg, ag))
+        games.setdefault(r["away_team"], []).append((ap, ag, hg))
+        home_games.setdefault(r["home_team"], []).append(hp)
+        meetings.append((r["home_team"], r["away_team"], hp / 3 if hp != 1 else 0.5))
+
+    def strength(team):
+        recent = games.get(team, [])[-WINDOWS["long_window"]:]
+        if not recent:
+            return 0.5
+        points, scored, conceded = (sum(column) for column in zip(*recent))
+        share = scored / (scored + conceded) if scored + conceded else 0.5
+        return 0.6 * points / (len(recent) * 3) + 0.4 * share
+
+    def form(team):
+        recent = games.get(team, [])[-WINDOWS["form_window"]:]
+        return sum(p for p, _, _ in recent) / (len(recent) * 3) if recent else 0.5
+
+    def home_advantage(team):
+        recent = home_games.get(team, [])[-WINDOWS["home_window"]:]
+        return sum(recent) / (len(recent) * 3) if recent else 0.5
+
+    pair = [m for m in meetings if {m[0], m[1]} == {home_team, away_team}][-WINDOWS["h2h_window"]:]
+    h2h = (
+        np.mean([score if home == home_team else 1.0 - score for home, _, score in pair])
+        if pair else 0.5
+    )
+    return [
+        strength(home_team), strength(away_team), home_advantage(home_team),
+        form(home_team), form(away_team), h2h, injuries,
+    ]
+
+
+def test_windows_match_brute_force_with_wraparound_and_growth():
+    # Capacity 2 forces team and pair arrays to grow several times
+    store = FeatureStore(capacity=2, **WINDOWS)
+    results = random_results(600)
+    fixtures = [
+        {"home_team": f"team{h}", "away_team": f"team{a}"}
+        for h in range(13) for a in range(13) if h != a
+    ]
+
+    for applied in (1, 7, 150, 600):
+        store.ingest(results[store.results_ingested:applied])
+        expected = [brute_force_features(results[:applied], f["home_team"], f["away_team"]) for f in fixtures]
+        np.testing.assert_allclose(store.features_batch(fixtures), expected, rtol=0, atol=1e-12)
+
+
+def test_head_to_head_is_oriented_to_the_fixture_home_team():
+    store = FeatureStore(**WINDOWS)
+    store.ingest([
+        {"home_team": "A", "away_team": "B", "home_goals": 2, "away_goals": 0},
+        {"home_team": "B", "away_team": "A", "home_goals": 1, "away_goals": 1},
+    ])
+
+    # A: a win and a draw against B
+    assert store.features("A", "B")[5] == pytest.approx(0.75)
+    assert store.features("B", "A")[5] == pytest.approx(0.25)
+    assert store.features("A", "C")[5] == 0.5
+
+
+def test_match_id_dedupe_through_the_shared_log(tmp_path):
+    log_path = str(tmp_path / "results.jsonl")
+    worker_a = FeatureStore(log_path=log_path, **WINDOWS)
+    worker_b = FeatureStore(log_path=log_path, **WINDOWS)
+    result = {"match_id": "m1", "home_team": "A", "away_team": "B", "home_goals": 1, "away_goals": 0}
+
+    assert worker_a.ingest([result]) == 1
+    # Re-posted to another worker: logged again, applied once everywhere
+    assert worker_b.ingest([result]) == 1
+    assert worker_a.sync() == 0
+    assert worker_a.results_ingested == worker_b.results_ingested == 1
+
+    # A fresh process replaying the log converges on the same state
+    replayed = FeatureStore(log_path=log_path, **WINDOWS)
+    replayed.sync()
+    assert replayed.features("A", "B") == worker_a.features("A", "B") == worker_b.features("A", "B")
+
+
+def test_partial_log_lines_wait_for_the_rest(tmp_path):
+    log_path = tmp_path / "results.jsonl"
+    store = FeatureStore(log_path=str(log_path), **WINDOWS)
+    log_path.write_text('{"match_id":"m1","home_team":"A","away_team":"B","home_goals":1,')
+
+    assert store.sync() == 0
+    with open(log_path, "a") as f:
+        f.write('"away_goals":0}\n')
+    assert store.sync() == 1
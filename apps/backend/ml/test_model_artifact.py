@@ -0,0 +1,104 @@
+"""
+Regression tests pinning the .mgjm artifact to sklearn's own inference.
+
+Run from this directory: python -m pytest test_model_artifact.py
+"""
+import tracemalloc
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from model_artifact import ArtifactError, forest_from_sklearn, load_artifact, save_artifact
+
+
+def fit_model(classes=(0, 1, 2), rows=2_000, n_estimators=25, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.random((rows, 7))
+    y = rng.choice(classes, rows)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=10, random_state=seed)
+    model.fit(scaler.transform(X), y)
+    return model, scaler
+
+
+@pytest.fixture
+def rows():
+    # Include exact threshold-like values and out-of-range rows
+    rng = np.random.default_rng(1)
+    return np.vstack([rng.random((500, 7)), np.zeros((1, 7)), np.ones((1, 7)), np.full((1, 7), 2.0)])
+
+
+@pytest.mark.parametrize("classes", [(0, 1, 2), (0, 2)])
+def test_artifact_matches_sklearn(tmp_path, rows, classes):
+    model, scaler = fit_model(classes)
+    path = str(tmp_path / "model.mgjm")
+    save_artifact(path, model, scaler, model_version="test")
+
+    forest, artifact_scaler, header = load_artifact(path)
+
+    np.testing.assert_allclose(artifact_scaler.transform(rows), scaler.transform(rows), rtol=0, atol=1e-12)
+    X = scaler.transform(rows)
+    np.testing.assert_array_equal(forest.classes_, model.classes_)
+    np.testing.assert_allclose(forest.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(forest.predict(X), model.predict(X))
+    assert header["model"]["n_estimators"] == model.n_estimators
+
+
+def test_single_row_and_blocks_match(tmp_path, rows):
+    model, scaler = fit_model()
+    forest = forest_from_sklearn(model)
+    X = scaler.transform(rows)
+    forest.block_size = 64
+
+    np.testing.assert_allclose(forest.predict_proba(X[:1]), model.predict_proba(X[:1]), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(forest.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_predict_proba_memory_is_bounded_by_block(rows):
+    model, scaler = fit_model()
+    forest = forest_from_sklearn(model)
+    X = np.tile(scaler.transform(rows), (100, 1))  # ~50k rows
+    unblocked = forest_from_sklearn(model)
+    unblocked.block_size = len(X)
+
+    tracemalloc.start()
+    try:
+        proba = forest.predict_proba(X)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    np.testing.assert_array_equal(proba, unblocked.predict_proba(X))
+    # A full (rows, trees, classes) float64 gather alone would be ~30 MB
+    per_row_output = proba.itemsize * proba.shape[1] + X.shape[1] * 4
+    assert peak < len(X) * per_row_output + 8 * 1024 * 1024
+
+
+def test_contributions_sum_to_probabilities(rows):
+    model, scaler = fit_model()
+    forest = forest_from_sklearn(model)
+    X = scaler.transform(rows)
+
+    bias, contributions = forest.contributions(X)
+
+    assert contributions.shape == (len(X), 7, 3)
+    np.testing.assert_allclose(bias + contributions.sum(axis=1), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_corrupt_and_truncated_artifacts_are_rejected(tmp_path):
+    model, scaler = fit_model(n_estimators=5)
+    path = tmp_path / "model.mgjm"
+    save_artifact(str(path), model, scaler, model_version="test")
+    data = path.read_bytes()
+
+    path.write_bytes(data[:-100])
+    with pytest.raises(ArtifactError, match="truncated"):
+        load_artifact(str(path))
+
+    corrupt = bytearray(data)
+    corrupt[-1] ^= 0xFF
+    path.write_bytes(bytes(corrupt))
+    with pytest.raises(ArtifactError, match="checksum"):
+        load_artifact(str(path))
@@ -0,0 +1,292 @@
+"""
+Opt-in traffic sampler for the ML API.
+
+``TrafficCaptureMiddleware`` records a random sample of requests (endpoint,
+timing, status, latency and the JSON body, so features are kept) to a
+compact rotating JSONL log. ``replay.py`` reads these logs back to drive the
+API with the real request mix.
+
+Each worker writes its own ``traffic-<pid>.jsonl`` so lines never
+interleave; the replay tool merges them by timestamp. Bodies larger than
+``ML_CAPTURE_MAX_BODY`` are stored as their size only (replay synthesizes
+a body of similar size). Client addresses are stored as a keyed hash
+(HMAC-SHA256 with ``ML_CAPTURE_SECRET``, or a random key created once in the
+capture directory), so they can't be reversed by hashing the IPv4 space.
+
+Lines are buffered and flushed by ``flush_periodically`` (started by the
+app) and on shutdown, so a recycled worker loses at most one interval.
+
+Capture is off unless ``ML_CAPTURE_RATE`` > 0 or it is enabled at runtime
+via ``POST /admin/capture``; when off, a request pays one attribute check.
+
+Environment:
+    ML_CAPTURE_RATE         fraction of requests to record, 0-1 (default 0)
+    ML_CAPTURE_DIR          output directory (default data/traffic)
+    ML_CAPTURE_MAX_BYTES    rotate a log past this size (default 16 MB)
+    ML_CAPTURE_BACKUPS      rotated files kept per worker (default 3)
+    ML_CAPTURE_MAX_BODY     largest body stored verbatim (default 256 KB)
+    ML_CAPTURE_SECRET       per-deployment key for client hashes
+"""
+import asyncio
+import glob
+import json
+import os
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# Streaming and admin endpoints are not part of the replayable mix
+EXCLUDED_PREFIXES = ("/live/stream", "/live/ws", "/admin", "/metrics", "/docs", "/openapi.json")
+
+
+class TrafficRecorder:
+    def __init__(
+        self,
+        rate: float = 0.0,
+        directory: str = "data/traffic",
+        max_bytes: int = 16 * 1024 * 1024,
+        backups: int = 3,
+        max_body: int = 256 * 1024,
+        flush_seconds: float = 1.0,
+    ):
+        self.rate = rate
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_body = max_body
+        self.flush_seconds = flush_seconds
+
+        self.recorded = 0
+        self._file = None
+        self._pid = None
+        self._last_flush = 0.0
+        self._last_request: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def configure(self, rate: float):
+        self.rate = min(max(rate, 0.0), 1.0)
+        if not self.enabled:
+            self.close()
+
+    def should_sample(self, path: str) -> bool:
+        return random.random() < self.rate and not path.startswith(EXCLUDED_PREFIXES)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"traffic-{os.getpid()}.jsonl")
+
+    def record(self, entry: Dict[str, Any]):
+        now = entry["t"]
+        entry["dt"] = round(now - self._last_request, 6) if self._last_request else 0.0
+        self._last_request = now
+
+        f = self._open()
+        f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.recorded += 1
+        if now - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Write buffered lines out, rotating the log if it is full."""
+        if self._file is None or self._pid != os.getpid():
+            return
+        self._file.flush()
+        self._last_flush = time.time()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    async def flush_periodically(self):
+        """Flush on a timer, so a quiet worker's tail still reaches disk."""
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except OSError:
+                self.configure(0.0)
+
+    def _open(self):
+        # A forked worker must not share the master's file handle
+        if self._file is None or self._pid != os.getpid():
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = open(self.path, "a")
+            self._pid = os.getpid()
+        return self._file
+
+    def _rotate(self):
+        self.close()
+        path = self.path
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.unlink(path)
+
+    def close(self):
+        if self._file is not None and self._pid == os.getpid():
+            self._file.close()
+        self._file = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "rate": self.rate,
+            "recorded": self.recorded,
+            "path": self.path if self.enabled else None,
+        }
+
+
+_client_key: Optional[bytes] = None
+
+
+def _load_client_key(directory: str) -> bytes:
+    secret = os.getenv("ML_CAPTURE_SECRET")
+    if secret:
+        return secret.encode()
+    # Shared by every worker and restart writing to this directory, so one
+    # client keeps one id across the capture files replay merges
+    os.makedirs(directory, exist_ok=True)
+    key_path = os.path.join(directory, ".client-key")
+    if not os.path.exists(key_path):
+        tmp_path = f"{key_path}.{os.getpid()}"
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+            f.write(os.urandom(32))
+        try:
+            os.link(tmp_path, key_path)  # atomic; loses to a concurrent worker
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp_path)
+    with open(key_path, "rb") as f:
+        return f.read()
+
+
+def _client_id(scope) -> Optional[str]:
+    import hashlib
+    import hmac
+
+    global _client_key
+    client = scope.get("client")
+    if not client:
+        return None
+    if _client_key is None:
+        try:
+            _client_key = _load_client_key(recorder.directory)
+        except OSError:
+            return None  # capture must never break serving
+    return hmac.new(_client_key, client[0].encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def hot_features(
+    directory: str,
+    limit: int = 100,
+    path: str = "/predict",
+    max_bytes: int = 4 * 1024 * 1024,
+) -> List[List[float]]:
+    """
+    Most frequently captured feature vectors for an endpoint, most
+    requested first. Reads the newest logs up to max_bytes in total.
+    """
+    files = sorted(
+        glob.glob(os.path.join(directory, "traffic-*.jsonl*")),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    marker = f'"p":"{path}"'
+    counts = Counter()
+    remaining = max_bytes
+    for name in files:
+        if remaining <= 0:
+            break
+        with open(name) as f:
+            for line in f:
+                remaining -= len(line)
+                if remaining <= 0:
+                    break
+                if marker not in line:
+                    continue
+                try:
+                    features = json.loads(line).get("b", {}).get("features")
+                except (ValueError, AttributeError):
+                    continue
+                if isinstance(features, list):
+                    counts[tuple(features)] += 1
+    return [list(features) for features, _ in counts.most_common(limit)]
+
+
+class TrafficCaptureMiddleware:
+    """Pure ASGI middleware that tees sampled requests into the recorder."""
+
+    def __init__(self, app, traffic_recorder: Optional[TrafficRecorder] = None):
+        self.app = app
+        self.recorder = traffic_recorder or recorder
+
+    async def __call__(self, scope, receive, send):
+        recorder = self.recorder
+        if scope["type"] != "http" or not recorder.enabled or not recorder.should_sample(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        started = time.time()
+        t0 = time.perf_counter()
+        chunks = []
+        body_size = 0
+        status = 500
+
+        async def receive_and_tee():
+            nonlocal body_size
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                body_size += len(body)
+                if body_size <= recorder.max_body:
+                    chunks.append(body)
+            return message
+
+        async def send_and_capture(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_and_tee, send_and_capture)
+        finally:
+            entry = {
+                "t": round(started, 6),
+                "m": scope["method"],
+                "p": scope["path"],
+                "s": status,
+                "ms": round((time.perf_counter() - t0) * 1000, 3),
+                "c": _client_id(scope),
+                "r": recorder.rate,
+            }
+            query = scope.get("query_string", b"")
+            if query:
+                entry["q"] = query.decode("latin-1")
+            if body_size:
+                entry["n"] = body_size
+                if body_size <= recorder.max_body:
+                    try:
+                        entry["b"] = json.loads(b"".join(chunks))
+                    except ValueError:
+                        pass  # non-JSON (e.g. multipart); size only
+            try:
+                recorder.record(entry)
+            except OSError:
+                # Capture must never break serving
+                recorder.configure(0.0)
+
+
+recorder = TrafficRecorder(
+    rate=float(os.getenv("ML_CAPTURE_RATE", 0)),
+    directory=os.getenv("ML_CAPTURE_DIR", os.path.join(os.path.dirname(__file__), "data", "traffic")),
+    max_bytes=int(os.getenv("ML_CAPTURE_MAX_BYTES", 16 * 1024 * 1024)),
+    backups=int(os.getenv("ML_CAPTURE_BACKUPS", 3)),
+    max_body=int(os.getenv("ML_CAPTURE_MAX_BODY", 256 * 1024)),
+)
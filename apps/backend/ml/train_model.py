@@ -115,8 +115,16 @@ def train_model():
     
     with open("model_data.pkl", "wb") as f:
         pickle.dump(model_data, f)
+
+    # mmap-able, checksummed artifact loaded by the API
+    from model_artifact import save_artifact
+    save_artifact(
+        "model_data.mgjm", model, scaler,
+        model_version=model_data["version"], accuracy=test_score,
+        metadata={"trained_date": model_data["trained_date"]}
+    )
     
-    logger.info("✅ Model saved to model_data.pkl")
+    logger.info("✅ Model saved to model_data.pkl and model_data.mgjm")
     return model, scaler, test_score
 
 if __name__ == "__main__":